@@ -0,0 +1,123 @@
+import argparse
+import datetime
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from sqlalchemy import event, text
+
+from db import database
+from db.crud import computers_db, entries_db, tickets_db
+
+"""
+    This .py file checks that the CRUD functions are served by the indexes of the
+    migrations (app/src/db/migrations).
+
+    Each check runs a CRUD function in a transaction that is rolled back, captures
+    the SQL it sends, and looks for the expected index in the EXPLAIN plan of that SQL.
+    Sequential scans are disabled for the checks, so that the result does not depend on
+    the amount of data: a check only fails if the index cannot serve the query at all,
+    or if it does not exist (e.g. a migration was not applied).
+
+    Usage (with the POSTGRES_* environment variables of the flask service):
+
+        python app/benchmarks/explain_indexes.py
+"""
+
+# (CRUD function, how it is called, the index its query must use)
+CHECKS = [
+    # As sent by the jobs page, with the total: every recent job is read, not only the first page
+    ("entries_db.get_jobs (recent, with total)", lambda db: entries_db.get_jobs(db, 10, 0, 'recent', 'created_at', with_total=True), "idx_entries_open_created_at"),
+    ("entries_db.get_jobs (recent, with total)", lambda db: entries_db.get_jobs(db, 10, 0, 'recent', 'created_at', with_total=True), "idx_entries_closed_signed_at"),
+    ("entries_db.get_jobs (all, by creation)", lambda db: entries_db.get_jobs(db, 10, 0, 'all', 'created_at'), "idx_entries_created_at"),
+    ("entries_db.get_jobs (all, by signature)", lambda db: entries_db.get_jobs(db, 10, 0, 'all', 'signed_at'), "idx_entries_signed_at"),
+    ("entries_db.count_all_jobs (recent)", lambda db: entries_db.count_all_jobs(db, 'recent'), "idx_entries_closed_signed_at"),
+    ("entries_db.read_all_entries", lambda db: entries_db.read_all_entries(db, 0, 10), "idx_entries_created_at"),
+    ("entries_db.read_all_entries_by_label", lambda db: entries_db.read_all_entries_by_label(db, 1, 0, 10), "idx_entries_label_created_at"),
+    ("entries_db.get_traffic", lambda db: entries_db.get_traffic(db, datetime.date(2025, 1, 1), datetime.date(2025, 2, 1)), "traffic_daily_pkey"),
+    ("tickets_db.read_all_tickets (open)", lambda db: tickets_db.read_all_tickets(db, 0, 10, ['open']), "idx_tickets_status_created_at"),
+    ("tickets_db.read_all_tickets (any status)", lambda db: tickets_db.read_all_tickets(db, 0, 10, []), "idx_tickets_created_at"),
+    ("tickets_db.count_open", lambda db: tickets_db.count_open(db), "summary_counters_pkey"),
+    ("computers_db.count_computers", lambda db: computers_db.count_computers(db), "summary_counters_pkey"),
+    ("computers_db.generic_search (substring)", lambda db: computers_db.generic_search(db, 'host-01', 10, 0), "idx_computers_search_text"),
+    ("computers_db.generic_search (fulltext)", lambda db: computers_db.generic_search(db, 'host', 10, 0, 'fulltext'), "idx_computers_search_document"),
+]
+
+def plan_indexes(plan: dict) -> set:
+    """
+    Returns the names of the indexes used anywhere in an EXPLAIN (FORMAT JSON) plan.
+    """
+    found = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", []):
+        found |= plan_indexes(child)
+    return found
+
+def explain(db, function) -> set:
+    """
+    Runs a CRUD function and returns the indexes used by the queries it sent.
+    """
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    connection = db.connection()
+    event.listen(connection, "before_cursor_execute", capture)
+    try:
+        function(db)
+    finally:
+        event.remove(connection, "before_cursor_execute", capture)
+
+    found = set()
+    cursor = connection.connection.driver_connection.cursor()
+    for statement, parameters in statements:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+        result = cursor.fetchone()[0]
+        plan = (json.loads(result) if isinstance(result, str) else result)[0]["Plan"]
+        found |= plan_indexes(plan)
+    cursor.close()
+
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks that the CRUD functions use their indexes")
+    parser.add_argument("--verbose", action="store_true", help="Print the indexes used by every check")
+    args = parser.parse_args()
+
+    database.init_engine({
+        'dbname': os.getenv('POSTGRES_DB', 'masterdatabase'),
+        'dbuser': os.getenv('POSTGRES_USER', 'user'),
+        'dbpass': os.getenv('POSTGRES_PASSWORD', 'password'),
+        'dbhost': os.getenv('POSTGRES_HOST', 'postgres'),
+        'dbport': os.getenv('POSTGRES_PORT', '5432'),
+        'DB_POOL_SIZE': 1, 'DB_MAX_OVERFLOW': 0, 'DB_POOL_TIMEOUT': 30, 'DB_POOL_RECYCLE': -1, 'DB_POOL_PRE_PING': False
+    })
+
+    failures = 0
+    db = database.SessionLocal()
+    try:
+        db.execute(text("SET LOCAL enable_seqscan = off"))
+        existing = set(db.execute(text("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()")).scalars())
+
+        for name, function, index in CHECKS:
+            if index not in existing:
+                # The migration creating it was not applied (or the index was dropped): the query cannot use it
+                print(f"FAIL  {name}: {index} does not exist")
+                failures += 1
+                continue
+
+            used = explain(db, function)
+            status = "OK  " if index in used else "FAIL"
+            failures += index not in used
+            print(f"{status}  {name}: {index}" + (f" (used: {', '.join(sorted(used)) or 'none'})" if args.verbose or index not in used else ""))
+    finally:
+        db.rollback()
+        db.close()
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
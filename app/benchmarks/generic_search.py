@@ -0,0 +1,108 @@
+import argparse
+import os
+import statistics
+import time
+
+import psycopg2
+
+"""
+    This .py file benchmarks the generic computer search (/api/v1/computers/generic)
+    before and after the trigram-indexed search_text column.
+
+    It copies the structure of the computers table (with its generated column and
+    indexes) into a scratch schema, fills it with synthetic computers, times both
+    search conditions for a few typical search terms and drops the schema.
+
+    Usage (with the POSTGRES_* environment variables of the flask service):
+
+        python app/benchmarks/generic_search.py --rows 100000
+"""
+
+SCHEMA = "bench_generic_search"
+
+# Search condition before the search_text column, as built by computers_db.generic_search
+LEGACY_CONDITION = """
+    host_name ILIKE %(pattern)s
+    OR CAST(uuid_label AS VARCHAR) LIKE %(pattern)s
+    OR CAST(secseal AS VARCHAR) LIKE %(pattern)s
+    OR ipv4_address LIKE %(pattern)s
+    OR replace(mac_address, ':', '') ILIKE %(pattern)s
+"""
+
+INDEXED_CONDITION = "search_text LIKE lower(%(pattern)s)"
+
+TERMS = ["HOST-0421", "10.3.12", "a1b2", "77513", "zzz-no-match"]
+
+def connect():
+    return psycopg2.connect(
+        dbname=os.getenv('POSTGRES_DB', 'masterdatabase'),
+        user=os.getenv('POSTGRES_USER', 'user'),
+        password=os.getenv('POSTGRES_PASSWORD', 'password'),
+        host=os.getenv('POSTGRES_HOST', 'postgres'),
+        port=os.getenv('POSTGRES_PORT', '5432')
+    )
+
+def seed(cursor, rows: int):
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"CREATE TABLE {SCHEMA}.computers (LIKE public.computers INCLUDING ALL)")
+    cursor.execute(f"""
+        INSERT INTO {SCHEMA}.computers (uuid_label, host_name, mac_address, ipv4_address, network, os, network_adapter, secseal)
+        SELECT
+            i,
+            'HOST-' || lpad(i::text, 6, '0'),
+            upper(substr(md5(i::text), 1, 2) || ':' || substr(md5(i::text), 3, 2) || ':' || substr(md5(i::text), 5, 2) || ':' ||
+                  substr(md5(i::text), 7, 2) || ':' || substr(md5(i::text), 9, 2) || ':' || substr(md5(i::text), 11, 2)),
+            '10.' || (i / 65536) %% 256 || '.' || (i / 256) %% 256 || '.' || i %% 256,
+            (ARRAY['__S', '__A', '__D', '__T'])[1 + i %% 4],
+            'Windows 11',
+            'Ethernet',
+            1000000 + i
+        FROM generate_series(1, %(rows)s) AS i
+    """, {"rows": rows})
+    cursor.execute(f"ANALYZE {SCHEMA}.computers")
+
+def time_query(cursor, condition: str, term: str, repeat: int) -> tuple[float, int]:
+    sql = f"SELECT * FROM {SCHEMA}.computers WHERE {condition} ORDER BY uuid_label DESC LIMIT 50"
+    params = {"pattern": f"%{term}%"}
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(sql, params)
+        found = len(cursor.fetchall())
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return statistics.median(timings), found
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the generic computer search")
+    parser.add_argument("--rows", type=int, default=100000, help="Number of synthetic computers")
+    parser.add_argument("--repeat", type=int, default=7, help="Runs per query, the median is reported")
+    args = parser.parse_args()
+
+    connection = connect()
+    connection.autocommit = True
+    cursor = connection.cursor()
+
+    cursor.execute("SELECT count(*) FROM pg_extension WHERE extname = 'pg_trgm'")
+    if not cursor.fetchone()[0]:
+        print("pg_trgm is not installed: the search_text column is not indexed, apply the init-db script first.")
+
+    try:
+        print(f"Seeding {args.rows} computers...")
+        seed(cursor, args.rows)
+
+        print(f"{'term':<15}{'legacy (ms)':>14}{'indexed (ms)':>14}{'speedup':>10}{'rows':>6}")
+        for term in TERMS:
+            legacy, found = time_query(cursor, LEGACY_CONDITION, term, args.repeat)
+            indexed, indexed_found = time_query(cursor, INDEXED_CONDITION, term, args.repeat)
+            if found != indexed_found:
+                print(f"Result mismatch for {term!r}: {found} != {indexed_found}")
+            print(f"{term:<15}{legacy:>14.2f}{indexed:>14.2f}{legacy / indexed:>9.1f}x{found:>6}")
+    finally:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        connection.close()
+
+if __name__ == '__main__':
+    main()
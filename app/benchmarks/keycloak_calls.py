@@ -0,0 +1,128 @@
+import argparse
+import os
+import sys
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from flask import Flask
+
+import kutils
+
+"""
+    This .py file checks the number of Keycloak calls of the user management operations
+    that promise an upper bound on them.
+
+    Keycloak is replaced by a fake KeycloakAdmin holding a few users and realm roles.
+    Each of its methods stands for one HTTP call and is counted as one by
+    kutils.count_keycloak_calls(), like the responses of the real shared client.
+    The count of a check covers the whole operation, including the fetch of the realm
+    role catalog when it is not cached.
+
+    Usage (no Keycloak or database is needed):
+
+        python app/benchmarks/keycloak_calls.py
+"""
+
+ROLES = [{'id': str(uuid.uuid4()), 'name': name} for name in ('default-roles-master', 'admin', 'GPolicy', 'viewer')]
+
+class FakeKeycloakAdmin:
+    """
+    A KeycloakAdmin with the methods of the checked operations, each counted as one Keycloak call.
+    A method it does not have fails the check with an AttributeError.
+    """
+
+    def __init__(self):
+        self.users = {}
+        self.user_roles = {}
+
+    def add_user(self, username: str, roles: list) -> str:
+        user_id = str(uuid.uuid4())
+        self.users[user_id] = {
+            'id': user_id, 'username': username, 'firstName': username.title(), 'lastName': 'Test',
+            'email': f'{username}@example.com', 'createdTimestamp': 1700000000000, 'enabled': True, 'emailVerified': True
+        }
+        self.user_roles[user_id] = [dict(role) for role in ROLES if role['name'] in roles]
+        return user_id
+
+    def _call(self):
+        kutils._count_call(None)
+
+    def get_realm_roles(self, brief_representation=True):
+        self._call()
+        return [dict(role) for role in ROLES]
+
+    def get_user_id(self, username):
+        self._call()
+        return next((user_id for user_id, user in self.users.items() if user['username'] == username), None)
+
+    def get_user(self, user_id):
+        self._call()
+        return dict(self.users[user_id])
+
+    def get_realm_roles_of_user(self, user_id):
+        self._call()
+        return [dict(role) for role in self.user_roles[user_id]]
+
+    def delete_realm_roles_of_user(self, user_id, roles):
+        self._call()
+        names = {role['name'] for role in roles}
+        self.user_roles[user_id] = [role for role in self.user_roles[user_id] if role['name'] not in names]
+
+    def assign_realm_roles(self, user_id, roles):
+        self._call()
+        self.user_roles[user_id] += [dict(role) for role in roles]
+
+def check_patch_user_roles(keycloak_admin: FakeKeycloakAdmin, by_username: bool, cached_catalog: bool) -> tuple[int, int]:
+    """
+    Replaces the roles of a user (one removed, one added) with patch_user_roles().
+
+    Returns:
+        tuple: The Keycloak calls it made and its upper bound: 4, one more to resolve a username
+            that is not cached, one more to fetch the role catalog that is not cached.
+    """
+    user_id = keycloak_admin.add_user(f'user{len(keycloak_admin.users)}', ['default-roles-master', 'admin', 'viewer'])
+    username = keycloak_admin.users[user_id]['username']
+
+    if cached_catalog:
+        kutils.get_role_catalog()
+    else:
+        kutils.invalidate_role_catalog()
+
+    with kutils.count_keycloak_calls() as counter:
+        result = kutils.patch_user_roles(username if by_username else user_id, ['admin', 'GPolicy'])
+
+    stored = sorted(role['name'] for role in keycloak_admin.user_roles[user_id])
+    if sorted(result['roles']) != ['GPolicy', 'admin'] or stored != ['GPolicy', 'admin', 'default-roles-master']:
+        raise RuntimeError(f"patch_user_roles left the roles {stored} and returned {result['roles']}")
+
+    return counter.calls, 4 + by_username + (not cached_catalog)
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks the upper bound of the Keycloak calls of the user management operations")
+    parser.parse_args()
+
+    keycloak_admin = FakeKeycloakAdmin()
+    kutils.initialize_admin_client = lambda: keycloak_admin
+
+    app = Flask(__name__)
+    app.config['settings'] = {
+        'KEYCLOAK_MAX_WORKERS': 1, 'INTROSPECTION_CACHE_SIZE': 0, 'INTROSPECTION_CACHE_TTL': 0, 'ROLE_CATALOG_TTL': 300, 'USER_ID_CACHE_SIZE': 100
+    }
+    kutils.configure_caches(app.config['settings'])
+
+    failures = 0
+    with app.app_context():
+        for by_username in (False, True):
+            for cached_catalog in (True, False):
+                name = f"patch_user_roles (by {'username' if by_username else 'UUID'}, role catalog {'cached' if cached_catalog else 'fetched'})"
+                calls, bound = check_patch_user_roles(keycloak_admin, by_username, cached_catalog)
+                if calls > bound:
+                    failures += 1
+                print(f"{'ok  ' if calls <= bound else 'FAIL'}  {name}: {calls} calls (at most {bound})")
+
+    if failures:
+        sys.exit(f"{failures} operation(s) exceed their upper bound of Keycloak calls")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from sqlalchemy import text
+from sqlalchemy.future import select
+
+from db import database
+from db.models import Computer, Entry, Ticket, Operator
+from db.db_schemas import ComputerSchema, EntrySchema, JobSchema, TicketSchema, OperatorSchema
+from db.crud import computers_db, entries_db, tickets_db, operators_db
+
+"""
+    This .py file benchmarks the read path of the list endpoints: the per-row cost of
+    building ORM objects and validating them through Pydantic (Schema(**obj.__dict__).model_dump()),
+    against selecting the schema columns as Core rows and zipping them into dictionaries
+    (db/rows.py, as the CRUD functions now do).
+
+    Both paths read the same page of rows. The rows are seeded in a transaction that is
+    rolled back at the end, so the benchmark leaves the database as it found it.
+
+    Usage (with the POSTGRES_* environment variables of the flask service):
+
+        python app/benchmarks/row_serialization.py --rows 10000
+"""
+
+SEED = [
+    """
+    INSERT INTO computers (uuid_label, host_name, mac_address, ipv4_address, network, os, network_adapter, secseal, make, model, user_name)
+    SELECT 100000000 + i, 'BENCH-' || i, 'BENCH:' || i, '10.' || (i / 256) % 256 || '.' || i % 256, '__S', 'Windows 11', 'Ethernet',
+           100000000 + i, 'Dell', 'OptiPlex', 'user' || i
+    FROM generate_series(1, :rows) AS i
+    """,
+    """
+    INSERT INTO entries (uuid_label, created_by, created_at, reason, status)
+    SELECT 100000000 + i, 'bench', now() + interval '1 day', 'benchmark', 'open'
+    FROM generate_series(1, :rows) AS i
+    """,
+    """
+    INSERT INTO tickets (created_by, created_at, priority, title, descr)
+    SELECT 'bench', now() + interval '1 day', 'low', 'Benchmark ticket ' || i, 'A ticket of the serialization benchmark'
+    FROM generate_series(1, :rows) AS i
+    """,
+    """
+    INSERT INTO operators (rank, fname, lname)
+    SELECT 'Sgt', 'First' || i, 'Last' || i
+    FROM generate_series(1, :rows) AS i
+    """,
+]
+
+def legacy_computers(db, rows: int) -> list:
+    result = db.execute(select(Computer).limit(rows).order_by(Computer.uuid_label.desc())).scalars().all()
+    return [ComputerSchema(**computer.__dict__).model_dump() for computer in result]
+
+def legacy_entries(db, rows: int) -> list:
+    result = db.execute(select(Entry).limit(rows).order_by(Entry.created_at.desc(), Entry.uuid.desc())).scalars().all()
+    return [EntrySchema(**entry.__dict__).model_dump() for entry in result]
+
+def legacy_jobs(db, rows: int) -> list:
+    result = db.execute(
+        select(Entry.uuid, Entry.uuid_label, Computer.host_name, Entry.created_by, Entry.created_at, Entry.signed_by, Entry.signed_at, Entry.status, Entry.reason)
+        .join(Computer, Entry.uuid_label == Computer.uuid_label)
+        .limit(rows).order_by(Entry.created_at.desc(), Entry.uuid.desc())
+    ).all()
+    return [JobSchema.model_validate(entry).model_dump() for entry in result]
+
+def legacy_tickets(db, rows: int) -> list:
+    result = db.execute(select(Ticket).limit(rows).order_by(Ticket.created_at.desc(), Ticket.id.desc())).scalars().all()
+    return [TicketSchema(**ticket.__dict__).model_dump() for ticket in result]
+
+def legacy_operators(db, rows: int) -> list:
+    result = db.execute(select(Operator).order_by(Operator.id.asc())).scalars().all()
+    return [OperatorSchema(**operator.__dict__).model_dump() for operator in result]
+
+# (list endpoint, ORM + Pydantic read, Core rows read)
+CASES = [
+    ("computers", legacy_computers, lambda db, rows: computers_db.read_all_computers(db, 0, rows)),
+    ("entries", legacy_entries, lambda db, rows: entries_db.read_all_entries(db, 0, rows)),
+    ("jobs", legacy_jobs, lambda db, rows: entries_db.get_jobs(db, rows, 0, 'all', 'created_at')),
+    ("tickets", legacy_tickets, lambda db, rows: tickets_db.read_all_tickets(db, 0, rows, [])),
+    ("operators", legacy_operators, lambda db, rows: operators_db.read_all_operators(db)),
+]
+
+def measure(db, function, rows: int, repeat: int) -> tuple[float, list]:
+    """
+    Returns the median time of a read in seconds and the rows it returned.
+    """
+    timings = []
+    for _ in range(repeat):
+        # Start every run with an empty identity map, as a new request would
+        db.expunge_all()
+        start = time.perf_counter()
+        result = function(db, rows)
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the per-row cost of the list reads")
+    parser.add_argument("--rows", type=int, default=10000, help="Rows seeded in each table and read by each list")
+    parser.add_argument("--repeat", type=int, default=7, help="Runs of each read, the median is reported")
+    args = parser.parse_args()
+
+    database.init_engine({
+        'dbname': os.getenv('POSTGRES_DB', 'masterdatabase'),
+        'dbuser': os.getenv('POSTGRES_USER', 'user'),
+        'dbpass': os.getenv('POSTGRES_PASSWORD', 'password'),
+        'dbhost': os.getenv('POSTGRES_HOST', 'postgres'),
+        'dbport': os.getenv('POSTGRES_PORT', '5432'),
+        'DB_POOL_SIZE': 1, 'DB_MAX_OVERFLOW': 0, 'DB_POOL_TIMEOUT': 30, 'DB_POOL_RECYCLE': -1, 'DB_POOL_PRE_PING': False
+    })
+
+    db = database.SessionLocal()
+    try:
+        for statement in SEED:
+            db.execute(text(statement), {"rows": args.rows})
+
+        print(f"{'list':<10} {'rows':>7} {'ORM + Pydantic':>16} {'Core rows':>12} {'speedup':>8}")
+        for name, legacy, fast in CASES:
+            before, expected = measure(db, legacy, args.rows, args.repeat)
+            after, result = measure(db, fast, args.rows, args.repeat)
+            if result != expected:
+                raise RuntimeError(f"The two {name} reads returned different rows")
+            count = len(result)
+
+            print(f"{name:<10} {count:>7} {before / count * 1e6:>13.2f} us {after / count * 1e6:>9.2f} us {before / after:>7.1f}x")
+    finally:
+        # Nothing of the seeded rows is kept
+        db.rollback()
+        db.close()
+
+if __name__ == '__main__':
+    main()
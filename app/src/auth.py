@@ -7,6 +7,15 @@ auth = HTTPTokenAuth(scheme="Bearer", header="Authorization", security_scheme_na
 
 security_doc = "BearerAuth"
 
+def introspection_required(f):
+    """
+    Marks a route as revocation-sensitive: its token is always checked against Keycloak's
+    introspection endpoint, even when local JWT verification (TOKEN_VERIFICATION=local) is enabled.
+    Must be placed below the authentication decorators.
+    """
+    f.introspection_required = True
+    return f
+
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -29,7 +38,7 @@ def admin_required(f):
                     return response, 401  
     
             # Check if the token is valid and corresponds to an admin user
-            if not kutils.introspect_admin_token(access_token):
+            if not kutils.introspect_admin_token(access_token, introspect=getattr(f, 'introspection_required', False)):
                 response = {
                     'success': False,
                     'help': request.url,
@@ -87,7 +96,7 @@ def gpolicy_required(f):
                     return response, 401  
     
             # Check if the token is valid and corresponds to an admin user
-            if not kutils.introspect_gpolicy_token(access_token):
+            if not kutils.introspect_gpolicy_token(access_token, introspect=getattr(f, 'introspection_required', False)):
                 response = {
                     'success': False,
                     'help': request.url,
@@ -146,7 +155,7 @@ def token_active(f):
                     return response, 401
 
             # Check if the token is valid
-            if not kutils.introspect_token(access_token):
+            if not kutils.introspect_token(access_token, introspect=getattr(f, 'introspection_required', False)):
                 response = {
                     'success': False,
                     'help': request.url,
@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import OrderedDict
+
+"""
+    This .py file contains the in-process caches used to avoid
+    repeated round trips to Keycloak.
+"""
+
+_MISSING = object()
+
+class _InFlight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class TTLCache:
+    """
+    A thread-safe LRU cache whose entries expire after a per-entry TTL.
+
+    Concurrent misses on the same key share a single load: the first caller runs the loader,
+    the others wait for its result (or its exception) instead of loading again.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def configure(self, maxsize: int = None, ttl: float = None):
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            self._evict()
+
+    def _evict(self):
+        while len(self._data) > max(self.maxsize, 0):
+            self._data.popitem(last=False)
+
+    def _lookup(self, key):
+        item = self._data.get(key, _MISSING)
+        if item is _MISSING:
+            return _MISSING
+        value, expires_at = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def set(self, key, value, ttl: float = None):
+        """
+        Stores a value. Values with a non-positive TTL are not stored (and replace nothing).
+        """
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            if ttl <= 0 or self.maxsize <= 0:
+                self._data.pop(key, None)
+                return
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            self._evict()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[0]
+
+    def pop_value(self, value) -> list:
+        """
+        Drops every entry holding the given value, e.g. a cached lookup known only by its result.
+
+        Returns:
+            list: The keys of the dropped entries.
+        """
+        with self._lock:
+            keys = [key for key, (cached, _) in self._data.items() if cached == value]
+            for key in keys:
+                del self._data[key]
+        return keys
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def get_or_load(self, key, loader, ttl=None):
+        """
+        Returns the cached value of the key, or loads it by calling loader().
+
+        Args:
+            key: The cache key.
+            loader: A callable without arguments that produces the value on a miss.
+            ttl: The TTL in seconds, or a callable that computes it from the loaded value. Defaults to the cache TTL.
+
+        Returns:
+            The cached or loaded value.
+
+        Raises:
+            Any exception raised by the loader, in the loading caller and in every caller waiting for it.
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                return value
+
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _InFlight()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = loader()
+            self.set(key, call.value, ttl(call.value) if callable(ttl) else ttl)
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.event.set()
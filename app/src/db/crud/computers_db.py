@@ -1,9 +1,17 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.future import select
-from sqlalchemy import insert, update, delete, func, or_, cast, String, Integer
+from sqlalchemy import insert, update, delete, func, or_, cast, String, Integer, literal_column, text
 from db.models import Computer, Entry
 from typing import List
 from db.db_schemas import ComputerSchema, EntrySchema
+from db.pagination import after_cursor, fetch_with_total
+from db.rows import schema_columns, schema_keys, row_dicts, row_dict
+from db.crud.counters_db import read_counter, read_counters
+import csv
+import io
+
+COMPUTER_COLUMNS = schema_columns(Computer, ComputerSchema)
+COMPUTER_KEYS = schema_keys(ComputerSchema)
 
 def generate_next_uuid_label(db: Session) -> int:
     stmt = select(func.max(Computer.uuid_label))
@@ -23,34 +31,38 @@ def generate_next_hostname(db: Session) -> int:
     return f"HOST-{next_number:05d}"
 
 def count_computers(db: Session) -> int:
+    return read_counter(db, 'computers')
 
-    stmt = select(func.count()).select_from(Computer)
-    result = db.execute(stmt).scalar()
-    return result
-
-def read_all_computers(db: Session, offset: int = 0, limit: int = 0) -> List[ComputerSchema]:
+def read_all_computers(db: Session, offset: int = 0, limit: int = 0, after: str = None, with_total: bool = False) -> List[ComputerSchema]:
+    """
+    Returns a page of computers, newest label first. With with_total, returns the page and the total
+    number of computers: read from the summary counters, or from the cursor on (if given) counted in the same query.
+    """
     
-    stmt = select(Computer).offset(offset).limit(limit=(limit if limit > 0 else None)).order_by(Computer.uuid_label.desc())
-    result = db.execute(stmt).scalars().all()
-    return [ComputerSchema(**computer.__dict__).model_dump() for computer in result]
+    stmt = select(*COMPUTER_COLUMNS).limit(limit=(limit if limit > 0 else None)).order_by(Computer.uuid_label.desc())
+    # A cursor continues right after the last computer of the previous page, the offset is ignored
+    stmt = after_cursor(stmt, 'computers', [Computer.uuid_label], after) if after else stmt.offset(offset)
 
-def read_computer_classes(db: Session) -> dict:
+    if with_total and not after:
+        return row_dicts(db.execute(stmt), COMPUTER_KEYS), read_counter(db, 'computers')
+    if with_total:
+        rows, total = fetch_with_total(db, stmt)
+        return row_dicts(rows, COMPUTER_KEYS), total
 
-    stmt = select(Computer.network, func.count(Computer.network)).group_by(Computer.network)
-    result = db.execute(stmt).all()
-    return result
+    return row_dicts(db.execute(stmt), COMPUTER_KEYS)
+
+def read_computer_classes(db: Session) -> dict:
+    return read_counters(db, 'computers', 'network')
 
 def read_computer(db: Session, host_name: str) -> ComputerSchema:
     
-    stmt = select(Computer).where(Computer.host_name == host_name)
-    result = db.execute(stmt).scalar_one_or_none()
-    return ComputerSchema(**result.__dict__).model_dump() if result is not None else None
+    stmt = select(*COMPUTER_COLUMNS).where(Computer.host_name == host_name)
+    return row_dict(db.execute(stmt).one_or_none(), COMPUTER_KEYS)
 
 def read_computer_by_label(db: Session, uuid_label: int) -> ComputerSchema:
     
-    stmt = select(Computer).where(Computer.uuid_label == uuid_label)
-    result = db.execute(stmt).scalar_one_or_none()
-    return ComputerSchema(**result.__dict__).model_dump() if result is not None else None
+    stmt = select(*COMPUTER_COLUMNS).where(Computer.uuid_label == uuid_label)
+    return row_dict(db.execute(stmt).one_or_none(), COMPUTER_KEYS)
 
 
 def create_computer(db: Session, computer: ComputerSchema, entry: EntrySchema) -> tuple[int, int]:
@@ -83,42 +95,191 @@ def delete_computer(db: Session, uuid_label: int = None, host_name: str = None)
         raise ValueError("Either uuid_label or host_name must be provided")
     return result
 
-def generic_search(db: Session, data: str, limit: int, offset: int) -> List[ComputerSchema]:
-    like_pattern = f"%{data}%"
+def search_filter(data: str):
+    """
+    Returns the condition of the generic search: the host name, label, security seal, IPv4 address
+    or MAC address (with or without colons) of the computer contains the searched text (case-insensitive).
+
+    It matches the normalized search_text column, so that the trigram index can be used.
+    """
+    return Computer.search_text.like(f"%{data.lower()}%")
+
+def fulltext_query(data: str):
+    """
+    Builds the full-text query of the searched text: every word must match, words of two or more
+    characters also match as prefixes (e.g. 'ath off' matches 'Athens Office').
+
+    Raises:
+        ValueError: If the searched text contains no words.
+    """
+    terms = []
+    for word in data.lower().split():
+        # Quoted terms are taken literally, quotes and backslashes are escaped
+        quoted = "'" + word.replace("\\", "\\\\").replace("'", "''") + "'"
+        terms.append(f"{quoted}:*" if len(word) >= 2 else quoted)
+
+    if not terms:
+        raise ValueError("The search text must contain at least one word...")
+
+    return func.to_tsquery(literal_column("'simple'"), " & ".join(terms))
+
+def generic_search(db: Session, data: str, limit: int, offset: int, mode: str = "substring", with_total: bool = False) -> List[ComputerSchema]:
+    """
+    Returns a page of the computers matching the searched text. With with_total, returns the page and
+    the total number of matches fetched in the same query, instead of a separate count_searched().
+    """
     
-    stmt = select(Computer).where(
-        or_(
-            # Case-insensitive search on the hostname
-            Computer.host_name.ilike(like_pattern),
-            # Convert integer columns to strings and search for the substring
-            cast(Computer.uuid_label, String).like(like_pattern),
-            cast(Computer.secseal, String).like(like_pattern),
-
-            Computer.ipv4_address.like(like_pattern),
-            # Case-insensitive search on the MAC address
-            func.replace(Computer.mac_address, ":", "").ilike(like_pattern)
-        )
-    ).order_by(Computer.uuid_label.desc()).limit(limit if limit > 0 else None).offset(offset)
+    if mode == "fulltext":
+        return fulltext_search(db=db, data=data, limit=limit, offset=offset, with_total=with_total)
+
+    stmt = select(*COMPUTER_COLUMNS).where(search_filter(data)).order_by(Computer.uuid_label.desc()).limit(limit if limit > 0 else None).offset(offset)
+
+    if with_total:
+        rows, total = fetch_with_total(db, stmt)
+        return row_dicts(rows, COMPUTER_KEYS), total
     
-    result = db.execute(stmt).scalars().all()
-    return [ComputerSchema(**computer.__dict__).model_dump() for computer in result]
+    return row_dicts(db.execute(stmt), COMPUTER_KEYS)
+
+def fulltext_search(db: Session, data: str, limit: int, offset: int, with_total: bool = False) -> List[ComputerSchema]:
+    """
+    Ranked full-text search over all the descriptive columns of the computers. The best matches come first,
+    the host name, label and addresses weigh the most, then the user and serial numbers, then the office
+    details and the model, then the network and OS. Each computer carries its relevance as 'rank'.
+    """
+    query = fulltext_query(data)
+    rank = func.ts_rank(Computer.search_document, query)
+
+    stmt = select(*COMPUTER_COLUMNS, rank.label("rank")).where(
+        Computer.search_document.op("@@")(query)
+    ).order_by(rank.desc(), Computer.uuid_label.desc()).limit(limit if limit > 0 else None).offset(offset)
+
+    if with_total:
+        rows, total = fetch_with_total(db, stmt)
+    else:
+        rows = db.execute(stmt).all()
+
+    computers = [{**computer, "rank": round(row.rank, 6)} for computer, row in zip(row_dicts(rows, COMPUTER_KEYS), rows)]
+    return (computers, total) if with_total else computers
 
-def count_searched(db: Session, data: str) -> int:
-    like_pattern = f"%{data}%"
+def count_searched(db: Session, data: str, mode: str = "substring") -> int:
     
-    stmt = select(func.count()).select_from(Computer).where(
-        or_(
-            # Case-insensitive search on the hostname
-            Computer.host_name.ilike(like_pattern),
-            # Convert integer columns to strings and search for the substring
-            cast(Computer.uuid_label, String).like(like_pattern),
-            cast(Computer.secseal, String).like(like_pattern),
-
-            Computer.ipv4_address.like(like_pattern),
-            # Case-insensitive search on the MAC address
-            func.replace(Computer.mac_address, ":", "").ilike(like_pattern)
-        )
-    )
+    if mode == "fulltext":
+        condition = Computer.search_document.op("@@")(fulltext_query(data))
+    else:
+        condition = search_filter(data)
+
+    stmt = select(func.count()).select_from(Computer).where(condition)
     
     result = db.execute(stmt).scalar_one()
-    return result
\ No newline at end of file
+    return result
+
+# Columns of a computer that can be imported, in the order of the staging table
+IMPORT_COLUMNS = [
+    "uuid_label", "host_name", "mac_address", "ipv4_address", "network", "os", "network_adapter", "secseal",
+    "make", "model", "pc_serialnumber", "net_adapter_serialnumber", "user_name", "yat", "office_number",
+    "telephone", "office_location"
+]
+
+# The unique columns of a computer, checked for conflicts before the import
+IMPORT_UNIQUE_COLUMNS = ["uuid_label", "host_name", "mac_address", "ipv4_address", "secseal"]
+
+def import_computers(db: Session, rows: list[tuple[int, dict]]) -> dict:
+    """
+    Registers many computers at once, each with its "Registration" entry.
+
+    The rows are loaded with COPY into a temporary staging table. A single query then finds the rows
+    whose unique columns already exist or appear more than once in the import, and the other rows
+    are inserted (computers and entries) in one statement, those without a label under the labels following
+    the highest one. The computers table is locked against concurrent writes meanwhile, so the conflict
+    check and the new labels hold until the commit.
+
+    Args:
+        db (Session): The database session.
+        rows (list): The validated rows as (row number, NewComputerRegistration data) pairs.
+
+    Returns:
+        dict: Per row number, either {"computer": uuid_label, "entry": entry uuid}
+            or {"errors": {column: [messages]}} for the rows that were not imported.
+    """
+    results = {}
+    if not rows:
+        return results
+
+    db.execute(text(f"""
+        CREATE TEMPORARY TABLE computer_import (
+            row_number INTEGER PRIMARY KEY,
+            created_by VARCHAR(255) NOT NULL,
+            uuid_label INTEGER,
+            {', '.join(f'{column} {"INTEGER" if column == "secseal" else "VARCHAR(255)"}' for column in IMPORT_COLUMNS[1:])}
+        ) ON COMMIT DROP
+    """))
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row_number, row in rows:
+        writer.writerow([row_number, row["created_by"]] + [row.get(column) for column in IMPORT_COLUMNS])
+    buffer.seek(0)
+
+    cursor = db.connection().connection.driver_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY computer_import (row_number, created_by, {', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+    db.execute(text("LOCK TABLE computers IN SHARE ROW EXCLUSIVE MODE"))
+
+    # For every unique column: the first row of the import using a value, and whether the value already exists
+    checks = ", ".join(
+        f"first_value(row_number) OVER (PARTITION BY {column} ORDER BY row_number) AS {column}_first, "
+        f"EXISTS (SELECT 1 FROM computers WHERE computers.{column} = computer_import.{column}) AS {column}_exists"
+        for column in IMPORT_UNIQUE_COLUMNS
+    )
+    conflicts = db.execute(text(f"SELECT row_number, {', '.join(IMPORT_UNIQUE_COLUMNS)}, {checks} FROM computer_import")).mappings().all()
+
+    rejected = []
+    for conflict in conflicts:
+        errors = {}
+        for column in IMPORT_UNIQUE_COLUMNS:
+            if conflict[column] is None:
+                continue
+            label = column.replace('_', ' ')
+            if conflict[f"{column}_exists"]:
+                errors[column] = [f"This {label} already exists."]
+            elif conflict[f"{column}_first"] != conflict["row_number"]:
+                errors[column] = [f"This {label} is already used by row {conflict[f'{column}_first']} of the import."]
+        if errors:
+            results[conflict["row_number"]] = {"errors": errors}
+            rejected.append(conflict["row_number"])
+
+    # Rows without a label get the next ones after the highest label, as generate_next_uuid_label()
+    # gives them (at least 100). The lock keeps them free until the commit.
+    inserted = db.execute(text(f"""
+        WITH accepted AS (
+            SELECT row_number, created_by, coalesce(uuid_label, (
+                SELECT greatest(max(uuid_label), 99)
+                FROM (SELECT uuid_label FROM computers UNION ALL SELECT uuid_label FROM computer_import) AS labels
+            ) + row_number() OVER (PARTITION BY uuid_label IS NULL ORDER BY row_number)) AS uuid_label, {', '.join(IMPORT_COLUMNS[1:])}
+            FROM computer_import
+            WHERE row_number <> ALL(CAST(:rejected AS INTEGER[]))
+        ), new_computers AS (
+            INSERT INTO computers ({', '.join(IMPORT_COLUMNS)})
+            SELECT {', '.join(IMPORT_COLUMNS)}
+            FROM accepted
+            ORDER BY row_number
+            RETURNING uuid_label
+        ), new_entries AS (
+            INSERT INTO entries (uuid_label, created_by, reason)
+            SELECT accepted.uuid_label, accepted.created_by, 'Registration'
+            FROM new_computers JOIN accepted ON accepted.uuid_label = new_computers.uuid_label
+            ORDER BY accepted.row_number
+            RETURNING uuid, uuid_label
+        )
+        SELECT accepted.row_number, new_entries.uuid_label, new_entries.uuid
+        FROM new_entries JOIN accepted ON accepted.uuid_label = new_entries.uuid_label
+    """), {"rejected": rejected}).all()
+
+    for row in inserted:
+        results[row.row_number] = {"computer": row.uuid_label, "entry": row.uuid}
+
+    db.commit()
+    return results
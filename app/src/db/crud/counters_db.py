@@ -0,0 +1,40 @@
+from sqlalchemy.orm import Session
+from sqlalchemy.future import select
+from db.models import SummaryCounter
+
+"""
+    This .py file contains the reads of the summary counters (summary_counters table).
+
+    The counters hold the number of computers, entries and tickets in total and per
+    network or status. Database triggers keep them current in the same transaction
+    as every insert, update or delete, so a count costs a primary key lookup.
+"""
+
+def read_counter(db: Session, entity: str, dimension: str = 'total', value: str = '') -> int:
+    """
+    Returns a single counter, 0 if nothing was counted under it yet.
+
+    Args:
+        db (Session): The database session.
+        entity (str): The counted table, e.g. 'tickets'.
+        dimension (str): The counted column, 'total' for all the rows of the table.
+        value (str): The value of the counted column.
+    """
+    stmt = select(SummaryCounter.count).where(
+        SummaryCounter.entity == entity,
+        SummaryCounter.dimension == dimension,
+        SummaryCounter.value == value
+    )
+    result = db.execute(stmt).scalar_one_or_none()
+    return result if result is not None else 0
+
+def read_counters(db: Session, entity: str, dimension: str) -> list[tuple[str, int]]:
+    """
+    Returns the non-zero counters of every value of a counted column, as (value, count) pairs.
+    """
+    stmt = select(SummaryCounter.value, SummaryCounter.count).where(
+        SummaryCounter.entity == entity,
+        SummaryCounter.dimension == dimension,
+        SummaryCounter.count > 0
+    ).order_by(SummaryCounter.value)
+    return db.execute(stmt).all()
@@ -1,89 +1,126 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.future import select
-from sqlalchemy import insert, update, delete, or_, and_, func, text, cast, Date
-from db.models import Entry, Computer
+from sqlalchemy import insert, update, delete, or_, and_, func, text, literal_column
+from db.models import Entry, Computer, TrafficDaily
 from typing import List
 from flask import jsonify
 from db.db_schemas import EntrySchema, JobSchema, PolicySchema, TrafficSchema
+from db.pagination import after_cursor, fetch_with_total
+from db.rows import schema_columns, schema_keys, row_dicts, row_dict
+from db.crud.counters_db import read_counter
 
+import datetime
 import logging
 
+ENTRY_COLUMNS = schema_columns(Entry, EntrySchema)
+ENTRY_KEYS = schema_keys(EntrySchema)
+
+# Jobs are entries with the host name of their computer
+JOB_COLUMNS = schema_columns(Entry, JobSchema, host_name=Computer.host_name)
+JOB_KEYS = schema_keys(JobSchema)
+
+POLICY_COLUMNS = schema_columns(Computer, PolicySchema, uuid_label=Entry.uuid_label)
+POLICY_KEYS = schema_keys(PolicySchema)
+
 def count_all_jobs(db: Session, filter: str) -> int:
 
     if filter == "recent":
-
-        stmt = select(func.count()).select_from(Entry).where(
-            or_(
-            # 1. Jobs that are not closed
-            Entry.status == 'open',
-            # 2. Jobs that are closed, but signed_at is within 24h
-            and_(
-                Entry.status == 'closed',
-                Entry.signed_at >= func.now() - text("interval '24 hours'")
-            )
-            )
+        # Open jobs come from their counter. Jobs closed within the last 24h depend on the time, they are
+        # counted with a range scan of the partial index of the closed jobs (idx_entries_closed_signed_at).
+        closed_recently = select(func.count()).select_from(Entry).where(
+            Entry.status == 'closed',
+            Entry.signed_at >= func.now() - text("interval '24 hours'")
         )
-    else:
-        stmt = select(func.count()).select_from(Entry)
-    
-    result = db.execute(stmt).scalar_one()
-    return result
+        return read_counter(db, 'entries', 'status', 'open') + db.execute(closed_recently).scalar_one()
+
+    return read_counter(db, 'entries')
+
+def recent_jobs_condition():
+    """
+    Returns the condition of the recent jobs: the open ones and the ones closed within the last 24h.
+    """
+    return or_(
+        # 1. Jobs that are not closed
+        Entry.status == 'open',
+        # 2. Jobs that are closed, but signed_at is within 24h
+        and_(
+            Entry.status == 'closed',
+            Entry.signed_at >= func.now() - text("interval '24 hours'")
+        )
+    )
 
-def get_jobs(db: Session, limit: int, offset: int, filter: str, sort: str) -> List[EntrySchema]:
+def job_sort_key(sort: str) -> list:
+    """
+    Returns the descending sort key of the jobs: the sort column and the job ID as tie-breaker.
+    Jobs that are not signed yet come first when sorting by signed_at.
+    """
+    if sort == "created_at":
+        return [Entry.created_at, Entry.uuid]
+    return [func.coalesce(Entry.signed_at, literal_column("'infinity'::timestamptz")), Entry.uuid]
+
+def get_jobs(db: Session, limit: int, offset: int, filter: str, sort: str, after: str = None, with_total: bool = False) -> List[EntrySchema]:
+    """
+    Returns a page of jobs. With with_total, returns the page and the total number of jobs
+    matching the filter (from the cursor on, if given) fetched in the same query. The total of
+    all the jobs is read from the summary counters instead, every entry has a computer.
+    """
+
+    stmt = select(*JOB_COLUMNS).join(
+        Computer, Entry.uuid_label == Computer.uuid_label
+    )
 
     if filter == "recent":
+        stmt = stmt.where(recent_jobs_condition())
 
-        stmt = select(Entry.uuid, Entry.uuid_label, Computer.host_name, Entry.created_by, Entry.created_at, Entry.signed_by, Entry.signed_at, Entry.status, Entry.reason).join(
-            Computer, Entry.uuid_label == Computer.uuid_label
-        ).where(
-            or_(
-            # 1. Jobs that are not closed
-            Entry.status == 'open',
-            # 2. Jobs that are closed, but signed_at is within 24h
-            and_(
-                Entry.status == 'closed',
-                Entry.signed_at >= func.now() - text("interval '24 hours'")
-            )
-        )
-        ).limit(
-            limit=(limit if limit > 0 else None)
-        ).offset(
-            offset
-        ).order_by(Entry.created_at.desc() if sort == "created_at" else Entry.signed_at.desc())
-    
-    else:
-        stmt = select(Entry.uuid, Entry.uuid_label, Computer.host_name, Entry.created_by, Entry.created_at, Entry.signed_by, Entry.signed_at, Entry.status, Entry.reason).join(
-            Computer, Entry.uuid_label == Computer.uuid_label
-        ).limit(
-            limit=(limit if limit > 0 else None)
-        ).offset(
-            offset
-        ).order_by(Entry.created_at.desc() if sort == "created_at" else Entry.signed_at.desc())
-
-    result = db.execute(stmt).all()
-    return [JobSchema.model_validate(entry).model_dump() for entry in result]
+    sort_key = job_sort_key(sort)
+    stmt = stmt.limit(
+        limit=(limit if limit > 0 else None)
+    ).order_by(*[column.desc() for column in sort_key])
+
+    # A cursor continues right after the last job of the previous page, the offset is ignored
+    stmt = after_cursor(stmt, f'jobs:{sort}', sort_key, after) if after else stmt.offset(offset)
+
+    if with_total and filter != "recent" and not after:
+        return row_dicts(db.execute(stmt), JOB_KEYS), read_counter(db, 'entries')
+    if with_total:
+        rows, total = fetch_with_total(db, stmt)
+        return row_dicts(rows, JOB_KEYS), total
+
+    return row_dicts(db.execute(stmt), JOB_KEYS)
 
 def get_job_by_id(db: Session, id: int) -> PolicySchema:
 
-    stmt = select(Entry.uuid_label, Computer.host_name, Computer.mac_address, Computer.ipv4_address, Computer.user_name, Computer.office_location, Computer.telephone).join(
+    stmt = select(*POLICY_COLUMNS).join(
         Computer, Entry.uuid_label == Computer.uuid_label
     ).where(
         Entry.uuid == id
     )
 
-    result = db.execute(stmt).one()
-    return PolicySchema.model_validate(result).model_dump()
+    return row_dict(db.execute(stmt).one(), POLICY_KEYS)
 
-def read_all_entries(db: Session, offset: int, limit: int) -> List[EntrySchema]:
-    stmt = select(Entry).offset(offset).limit(limit=(limit if limit > 0 else None)).order_by(Entry.created_at.desc())
-    result = db.execute(stmt).scalars().all()
-    return [EntrySchema(**entry.__dict__).model_dump() for entry in result]
+def read_all_entries(db: Session, offset: int, limit: int, after: str = None, with_total: bool = False) -> List[EntrySchema]:
+    stmt = select(*ENTRY_COLUMNS).limit(limit=(limit if limit > 0 else None)).order_by(Entry.created_at.desc(), Entry.uuid.desc())
+    # A cursor continues right after the last entry of the previous page, the offset is ignored
+    stmt = after_cursor(stmt, 'entries', [Entry.created_at, Entry.uuid], after) if after else stmt.offset(offset)
+
+    if with_total and not after:
+        return row_dicts(db.execute(stmt), ENTRY_KEYS), read_counter(db, 'entries')
+    if with_total:
+        rows, total = fetch_with_total(db, stmt)
+        return row_dicts(rows, ENTRY_KEYS), total
+
+    return row_dicts(db.execute(stmt), ENTRY_KEYS)
     
-def read_all_entries_by_label(db: Session, uuid_label: int, offset: int = 0, limit: int = 0) -> List[EntrySchema]:
+def read_all_entries_by_label(db: Session, uuid_label: int, offset: int = 0, limit: int = 0, after: str = None, with_total: bool = False) -> List[EntrySchema]:
+
+    stmt = select(*ENTRY_COLUMNS).where(Entry.uuid_label == uuid_label).limit(limit=(limit if limit > 0 else None)).order_by(Entry.created_at.desc(), Entry.uuid.desc())
+    stmt = after_cursor(stmt, 'entries', [Entry.created_at, Entry.uuid], after) if after else stmt.offset(offset)
 
-    stmt = select(Entry).where(Entry.uuid_label == uuid_label).offset(offset).limit(limit=(limit if limit > 0 else None)).order_by(Entry.created_at.desc())
-    result = db.execute(stmt).scalars().all()
-    return [EntrySchema(**entry.__dict__).model_dump() for entry in result]
+    if with_total:
+        rows, total = fetch_with_total(db, stmt)
+        return row_dicts(rows, ENTRY_KEYS), total
+
+    return row_dicts(db.execute(stmt), ENTRY_KEYS)
 
 def create_entry(db: Session, entry: EntrySchema) -> int:
 
@@ -112,46 +149,32 @@ def delete_entry(db: Session, uuid: int) -> int:
     
     return result
 
-def get_traffic(db: Session) -> List[TrafficSchema]:
+def get_traffic(db: Session, start: datetime.date = None, end: datetime.date = None, networks: list[str] = None) -> List[TrafficSchema]:
+    """
+    Returns the number of entries created per day and network, read from the daily rollup (traffic_daily).
+
+    Args:
+        db (Session): The database session.
+        start (date): The first day, by default 40 days before today.
+        end (date): The last day (inclusive), by default today.
+        networks (list): The networks to return, by default all of them.
 
-    # networks of interest
-    NETWORKS = ["__S", "__A", "__D", "__T"]
+    Raises:
+        ValueError: If the start is after the end.
+    """
+    if start is not None and end is not None and start > end:
+        raise ValueError(f"The start of the date range ({start}) is after its end ({end})...")
 
     stmt = (
-        select(
-            cast(func.date_trunc('day', Entry.created_at), Date).label("date"),
-            Computer.network.label("network"),
-            func.count(Entry.uuid).label("total")
-        )
-        .join(Computer, Entry.uuid_label == Computer.uuid_label)
+        select(TrafficDaily.day, TrafficDaily.network, TrafficDaily.count)
         .where(
-            Computer.network.in_(NETWORKS),
-            Entry.created_at >= func.now() - text("interval '40 days'")
-        )
-        .group_by(
-            func.date_trunc('day', Entry.created_at),
-            Computer.network
-        )
-        .order_by(
-            func.date_trunc('day', Entry.created_at).asc(),
-            Computer.network.asc()
+            TrafficDaily.day >= (start if start is not None else func.current_date() - 40),
+            TrafficDaily.day <= (end if end is not None else func.current_date())
         )
+        .order_by(TrafficDaily.day.asc(), TrafficDaily.network.asc())
     )
+    if networks:
+        stmt = stmt.where(TrafficDaily.network.in_(networks))
 
     rows = db.execute(stmt).all()
-    logging.error('=====================================')
-    logging.error(rows)
-    logging.error('=====================================')
-
-    # Option A: Directly construct from row attributes
-    traffic_list = []
-    for row in rows:
-        # row is something like (date=..., network=..., count=...)
-        traffic_list.append(
-            TrafficSchema(
-                date=str(row.date),
-                network=row.network,
-                count=row.total
-            )
-        )
-    return [traffic.model_dump() for traffic in traffic_list]
+    return [{'date': str(day), 'network': network, 'count': count} for day, network, count in rows]
@@ -3,10 +3,14 @@ from sqlalchemy.future import select
 from sqlalchemy import insert, update, delete
 from db.models import Operator
 from db.db_schemas import OperatorSchema
+from db.rows import schema_columns, schema_keys, row_dicts, row_dict
 from typing import List
 
 import logging
 
+OPERATOR_COLUMNS = schema_columns(Operator, OperatorSchema)
+OPERATOR_KEYS = schema_keys(OperatorSchema)
+
 def create_operator(db: Session, operator: OperatorSchema) -> int:
     stmt = insert(Operator).values(**operator.model_dump(exclude={"id"})).returning(Operator.id)
     result = db.execute(stmt).scalar_one()
@@ -14,16 +18,15 @@ def create_operator(db: Session, operator: OperatorSchema) -> int:
     return result
 
 def read_operator(db: Session, operator_id: int) -> OperatorSchema:
-    stmt = select(Operator).where(Operator.id == operator_id)
-    result = db.execute(stmt).scalar_one_or_none()
+    stmt = select(*OPERATOR_COLUMNS).where(Operator.id == operator_id)
+    result = db.execute(stmt).one_or_none()
     if result is None:
         raise AttributeError(f"Operator with id={operator_id} was not found...")
-    return OperatorSchema(**result.__dict__).model_dump()
+    return row_dict(result, OPERATOR_KEYS)
 
 def read_all_operators(db: Session) -> List[OperatorSchema]:
-    stmt = select(Operator).order_by(Operator.id.asc())
-    result = db.execute(stmt).scalars().all()
-    return [OperatorSchema(**operator.__dict__).model_dump() for operator in result]
+    stmt = select(*OPERATOR_COLUMNS).order_by(Operator.id.asc())
+    return row_dicts(db.execute(stmt), OPERATOR_KEYS)
 
 def update_operator(db: Session, operator_id: int, new_data: OperatorSchema) -> int:
     stmt = update(Operator).where(Operator.id == operator_id).values(**new_data.model_dump(exclude_none=True, exclude={"id"}))
@@ -3,13 +3,17 @@ from sqlalchemy.future import select
 from sqlalchemy import insert, update, delete, func
 from db.models import Ticket
 from db.db_schemas import TicketSchema
+from db.pagination import after_cursor, fetch_with_total
+from db.rows import schema_columns, schema_keys, row_dicts, row_dict
+from db.crud.counters_db import read_counter, read_counters
 from typing import List
 import logging
 
+TICKET_COLUMNS = schema_columns(Ticket, TicketSchema)
+TICKET_KEYS = schema_keys(TicketSchema)
+
 def count_open(db: Session) -> int:
-    stmt = select(func.count(Ticket.id)).where(Ticket.status == "open")
-    result = db.execute(stmt).scalar_one_or_none()
-    return result if result is not None else 0
+    return read_counter(db, 'tickets', 'status', 'open')
 
 def create_ticket(db: Session, ticket: TicketSchema) -> int:
     stmt = insert(Ticket).values(ticket.model_dump(exclude_none=True, exclude={"id", "created_at"})).returning(Ticket.id)
@@ -18,16 +22,30 @@ def create_ticket(db: Session, ticket: TicketSchema) -> int:
     return result
 
 def read_ticket(db: Session, ticket_id: int) -> TicketSchema:
-    stmt = select(Ticket).where(Ticket.id == ticket_id)
-    result = db.execute(stmt).scalar_one_or_none()
+    stmt = select(*TICKET_COLUMNS).where(Ticket.id == ticket_id)
+    result = db.execute(stmt).one_or_none()
     if result is None:
         raise ValueError(f"Ticket with id={ticket_id} was not found...")
-    return TicketSchema(**result.__dict__).model_dump()
+    return row_dict(result, TICKET_KEYS)
+
+def read_all_tickets(db: Session, offset: int, limit: int, status: list[str], after: str = None, with_total: bool = False) -> List[TicketSchema]:
+    """
+    Returns a page of tickets, newest first. With with_total, returns the page and the total number of
+    tickets with the given statuses: read from the summary counters (per status), or from the cursor on
+    (if given) counted in the same query.
+    """
+    stmt = select(*TICKET_COLUMNS).where(Ticket.status.in_(status) if len(status) > 0 else True).limit(limit if limit > 0 else None).order_by(Ticket.created_at.desc(), Ticket.id.desc())
+    # A cursor continues right after the last ticket of the previous page, the offset is ignored
+    stmt = after_cursor(stmt, 'tickets', [Ticket.created_at, Ticket.id], after) if after else stmt.offset(offset)
+
+    if with_total and not after:
+        total = sum(count for value, count in read_counters(db, 'tickets', 'status') if value in status) if status else read_counter(db, 'tickets')
+        return row_dicts(db.execute(stmt), TICKET_KEYS), total
+    if with_total:
+        rows, total = fetch_with_total(db, stmt)
+        return row_dicts(rows, TICKET_KEYS), total
 
-def read_all_tickets(db: Session, offset: int, limit: int, status: list[str]) -> List[TicketSchema]:
-    stmt = select(Ticket).where(Ticket.status.in_(status) if len(status) > 0 else True).offset(offset).limit(limit if limit > 0 else None).order_by(Ticket.created_at.desc())
-    result = db.execute(stmt).scalars().all()
-    return [TicketSchema(**ticket.__dict__).model_dump() for ticket in result]
+    return row_dicts(db.execute(stmt), TICKET_KEYS)
 
 def update_ticket(db: Session, ticket_id: int, values: dict) -> int:
     stmt = update(Ticket).where(Ticket.id == ticket_id).values(values)
@@ -0,0 +1,277 @@
+from sqlalchemy.future import select
+from sqlalchemy import Integer, String, Text, DateTime, Date
+from sqlalchemy.engine import URL
+from sqlalchemy import create_engine
+from db.database import SessionLocal
+from db.rows import schema_columns
+from flask import request
+from db.models import Computer, Entry, Ticket
+from db.db_schemas import ComputerSchema, EntrySchema, TicketSchema, JobSchema
+import argparse
+import datetime
+import json
+import csv
+import io
+import os
+
+"""
+    This .py file contains the streaming exports of the computers, entries, jobs and tickets.
+
+    An export reads its table through a server-side cursor, one chunk of rows at a time,
+    and yields each chunk already encoded. Nothing but the current chunk is held in memory,
+    and the response starts as soon as the first chunk is read.
+
+    Text formats (CSV, NDJSON) are encoded row by row. Columnar formats (Arrow IPC file,
+    Parquet) turn each chunk into a record batch, column by column, with the types of the
+    table columns. They need pyarrow, an optional dependency imported on first use.
+
+    The generators outlive the request handler, so they open (and close) their own session.
+    Columnar snapshots can also be written to a file (from app/src):
+
+        python -m db.export entries parquet /tmp/entries.parquet
+"""
+
+EXPORT_CHUNK_SIZE = 1000
+
+# Rows per record batch (and Parquet row group) of the columnar exports
+COLUMNAR_CHUNK_SIZE = 50000
+
+COLUMNAR_FORMATS = ['arrow', 'parquet']
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'arrow': 'application/vnd.apache.arrow.file',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+def export_query(table: str):
+    """
+    Returns the select statement of an exported table: the columns of its API schema, in a stable order.
+
+    Args:
+        table (str): 'computers', 'entries', 'jobs' (entries with the host name of their computer) or 'tickets'.
+    """
+    if table == 'computers':
+        return select(*schema_columns(Computer, ComputerSchema)).order_by(Computer.uuid_label)
+    if table == 'entries':
+        return select(*schema_columns(Entry, EntrySchema)).order_by(Entry.uuid)
+    if table == 'jobs':
+        return select(*schema_columns(Entry, JobSchema, host_name=Computer.host_name)).join(Computer, Entry.uuid_label == Computer.uuid_label).order_by(Entry.uuid)
+    if table == 'tickets':
+        return select(*schema_columns(Ticket, TicketSchema)).order_by(Ticket.id)
+
+    raise ValueError(f"Unknown export {table}...")
+
+def require_pyarrow():
+    """
+    Imports pyarrow for the columnar exports.
+
+    Raises:
+        ImportError: If pyarrow is not installed.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("The columnar exports (arrow, parquet) need pyarrow, which is not installed...")
+    return pyarrow
+
+def export_unavailable(error: ImportError):
+    """
+    Returns the error response of a columnar export requested while pyarrow is not installed.
+    """
+    return {
+        "url": request.url,
+        "success": False,
+        "result": {
+            "error": "Not Implemented",
+            "message": str(error)
+        }
+    }, 501
+
+def export_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+def format_chunk(rows: list, columns: list, format: str) -> str:
+    """
+    Formats a chunk of rows as CSV lines or NDJSON lines.
+    """
+    if format == 'csv':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([[export_value(value) for value in row] for row in rows])
+        return buffer.getvalue()
+
+    return "".join(json.dumps(dict(zip(columns, map(export_value, row)))) + "\n" for row in rows)
+
+def read_chunks(stmt, chunk_size: int):
+    """
+    Generates the rows of a statement in chunks, read through a server-side cursor of its own session.
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(stream_results=True, yield_per=chunk_size))
+        for rows in result.partitions():
+            yield rows
+    finally:
+        # Also reached when the client disconnects and the response is closed early
+        db.close()
+
+def arrow_schema(stmt):
+    """
+    Returns the Arrow schema of the columns of a select statement.
+    """
+    pa = require_pyarrow()
+
+    fields = []
+    for column in stmt.selected_columns:
+        if isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp('us', tz='UTC')
+        elif isinstance(column.type, Date):
+            arrow_type = pa.date32()
+        elif isinstance(column.type, (String, Text)):
+            arrow_type = pa.string()
+        else:
+            raise ValueError(f"Column {column.name} of type {column.type} cannot be exported...")
+        fields.append(pa.field(column.name, arrow_type))
+
+    return pa.schema(fields)
+
+def record_batches(stmt, schema, chunk_size: int = COLUMNAR_CHUNK_SIZE):
+    """
+    Generates the record batches of a statement, one per chunk of rows, built column by column.
+    """
+    pa = require_pyarrow()
+
+    for rows in read_chunks(stmt, chunk_size):
+        columns = list(zip(*rows))
+        yield pa.RecordBatch.from_arrays([pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema)
+
+def columnar_writer(format: str, sink, schema):
+    pa = require_pyarrow()
+
+    if format == 'parquet':
+        return pa.parquet.ParquetWriter(sink, schema)
+    return pa.ipc.new_file(sink, schema)
+
+class ChunkSink:
+    """
+    A write-only file collecting what a columnar writer writes, drained after every record batch.
+    tell() counts every byte ever written, as the writers record offsets in their footers.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def stream_text(stmt, format: str, chunk_size: int = EXPORT_CHUNK_SIZE):
+    columns = [column.name for column in stmt.selected_columns]
+
+    if format == 'csv':
+        yield format_chunk([columns], columns, 'csv')
+
+    for rows in read_chunks(stmt, chunk_size):
+        yield format_chunk(rows, columns, format)
+
+def stream_columnar(stmt, format: str, schema):
+    sink = ChunkSink()
+    writer = columnar_writer(format, sink, schema)
+    for batch in record_batches(stmt, schema):
+        writer.write_batch(batch)
+        yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
+
+def stream_export(table: str, format: str, where: list = None):
+    """
+    Returns the generator of an export, chunk by chunk.
+
+    Args:
+        table (str): 'computers', 'entries', 'jobs' or 'tickets'.
+        format (str): 'csv' (with a header line), 'ndjson', 'arrow' (Arrow IPC file) or 'parquet'.
+        where (list): Optional conditions on the exported rows.
+
+    Raises:
+        ImportError: If the format is columnar and pyarrow is not installed.
+    """
+    stmt = export_query(table).where(*(where or []))
+
+    if format in COLUMNAR_FORMATS:
+        # Resolved before the response starts, so that a missing pyarrow is reported as an error
+        return stream_columnar(stmt, format, arrow_schema(stmt))
+
+    return stream_text(stmt, format)
+
+def write_columnar(table: str, format: str, path: str, where: list = None) -> int:
+    """
+    Writes a columnar snapshot of a table to a local file.
+
+    Returns:
+        int: The number of exported rows.
+    """
+    stmt = export_query(table).where(*(where or []))
+    schema = arrow_schema(stmt)
+
+    count = 0
+    writer = columnar_writer(format, path, schema)
+    try:
+        for batch in record_batches(stmt, schema):
+            writer.write_batch(batch)
+            count += batch.num_rows
+    finally:
+        writer.close()
+
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Writes a columnar snapshot of a table to a local file")
+    parser.add_argument("table", choices=['computers', 'entries', 'jobs', 'tickets'])
+    parser.add_argument("format", choices=COLUMNAR_FORMATS)
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    url = URL.create(
+        "postgresql+psycopg2",
+        username=os.getenv('POSTGRES_USER', 'user'),
+        password=os.getenv('POSTGRES_PASSWORD', 'password'),
+        host=os.getenv('POSTGRES_HOST', 'postgres'),
+        port=int(os.getenv('POSTGRES_PORT', '5432')),
+        database=os.getenv('POSTGRES_DB', 'masterdatabase')
+    )
+    engine = create_engine(url)
+    SessionLocal.configure(bind=engine)
+    try:
+        count = write_columnar(args.table, args.format, args.path)
+    finally:
+        engine.dispose()
+
+    print(f"Exported {count} {args.table} to {args.path}")
+
+if __name__ == '__main__':
+    main()
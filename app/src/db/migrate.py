@@ -0,0 +1,159 @@
+from sqlalchemy.engine import URL
+from sqlalchemy import create_engine
+import os
+import re
+import time
+import logging
+
+"""
+    This .py file contains the versioned migrations of the masterdatabase schema.
+
+    init-db/sql-init-masterdatabase.sql only creates the base tables of a new database.
+    Everything after it is a numbered SQL file in db/migrations (NNNN_description.sql),
+    applied once and in order, each recorded in the schema_migrations table.
+
+    A migration runs in a single transaction, unless its first line is
+    '-- migrate: no-transaction' (e.g. for CREATE INDEX CONCURRENTLY). Its statements
+    then run one by one, and they must be written so that a failed run can be retried
+    (IF NOT EXISTS, after dropping any index left INVALID by the failure).
+
+    Migrations are applied when the application starts (DB_MIGRATE_ON_START) or with:
+
+        python db/migrate.py
+"""
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Key of the advisory lock taken while migrating, so that workers starting together migrate one at a time
+MIGRATION_LOCK_ID = 4242019
+MIGRATION_LOCK_POLL_INTERVAL = 0.5
+
+NO_TRANSACTION = '-- migrate: no-transaction'
+
+def list_migrations() -> list[tuple[int, str, str]]:
+    """
+    Returns the migrations shipped with the application as (version, name, path), sorted by version.
+
+    Raises:
+        ValueError: If two migrations have the same version.
+    """
+    migrations = {}
+    for filename in os.listdir(MIGRATIONS_DIR):
+        m = re.match(r'^(\d+)_(.+)\.sql$', filename)
+        if not m:
+            continue
+        version = int(m.group(1))
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version {version}: {filename} and {migrations[version][1]}.sql")
+        migrations[version] = (version, m.group(2), os.path.join(MIGRATIONS_DIR, filename))
+
+    return [migrations[version] for version in sorted(migrations)]
+
+def split_statements(sql: str) -> list[str]:
+    """
+    Splits a no-transaction migration into its statements, each ending with ';' at the end of a line.
+    """
+    statements = []
+    current = []
+    for line in sql.splitlines():
+        if not current and (not line.strip() or line.lstrip().startswith('--')):
+            continue
+        current.append(line)
+        if line.rstrip().endswith(';'):
+            statements.append('\n'.join(current))
+            current = []
+
+    if current:
+        statements.append('\n'.join(current))
+    return statements
+
+def migrate(engine) -> list[str]:
+    """
+    Applies the pending migrations, holding an advisory lock for the whole run.
+
+    Args:
+        engine: The database engine.
+
+    Returns:
+        list: The names of the applied migrations, empty if the schema was up to date.
+    """
+    applied = []
+
+    connection = engine.raw_connection()
+    dbapi_connection = connection.driver_connection
+    dbapi_connection.autocommit = True
+    cursor = dbapi_connection.cursor()
+    try:
+        # Poll for the lock rather than blocking in pg_advisory_lock(): a waiting statement keeps a transaction
+        # open, and CREATE INDEX CONCURRENTLY in the running migration would wait for it (a deadlock)
+        while True:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+            if cursor.fetchone()[0]:
+                break
+            time.sleep(MIGRATION_LOCK_POLL_INTERVAL)
+
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # Read after taking the lock: another worker may just have applied some of them
+            cursor.execute("SELECT version FROM schema_migrations")
+            done = {row[0] for row in cursor.fetchall()}
+
+            for version, name, path in list_migrations():
+                if version in done:
+                    continue
+
+                with open(path) as file:
+                    sql = file.read()
+
+                logging.info(f"Applying database migration {version:04d}_{name}")
+                if sql.startswith(NO_TRANSACTION):
+                    for statement in split_statements(sql):
+                        cursor.execute(statement)
+                    cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+                else:
+                    cursor.execute("BEGIN")
+                    try:
+                        cursor.execute(sql)
+                        cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+                        cursor.execute("COMMIT")
+                    except Exception:
+                        cursor.execute("ROLLBACK")
+                        raise
+
+                applied.append(f"{version:04d}_{name}")
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+    finally:
+        cursor.close()
+        dbapi_connection.autocommit = False
+        connection.close()
+
+    return applied
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+
+    url = URL.create(
+        "postgresql+psycopg2",
+        username=os.getenv('POSTGRES_USER', 'user'),
+        password=os.getenv('POSTGRES_PASSWORD', 'password'),
+        host=os.getenv('POSTGRES_HOST', 'postgres'),
+        port=int(os.getenv('POSTGRES_PORT', '5432')),
+        database=os.getenv('POSTGRES_DB', 'masterdatabase')
+    )
+    engine = create_engine(url)
+    try:
+        applied = migrate(engine)
+    finally:
+        engine.dispose()
+
+    print(f"Applied {len(applied)} migration(s)" + (": " + ", ".join(applied) if applied else ", the schema is up to date."))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+-- Sort keys of the list endpoints (keyset pagination), the unique tie-breaker last
+CREATE INDEX IF NOT EXISTS idx_entries_created_at ON entries (created_at DESC, uuid DESC);
+CREATE INDEX IF NOT EXISTS idx_entries_label_created_at ON entries (uuid_label, created_at DESC, uuid DESC);
+CREATE INDEX IF NOT EXISTS idx_entries_signed_at ON entries ((COALESCE(signed_at, 'infinity'::timestamptz)) DESC, uuid DESC);
+CREATE INDEX IF NOT EXISTS idx_tickets_created_at ON tickets (created_at DESC, id DESC);
@@ -0,0 +1,24 @@
+-- Generic computer search: normalized searchable text covered by a trigram index, so that
+-- substring matches (LIKE '%...%') do not scan the whole table
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE computers ADD COLUMN IF NOT EXISTS search_text TEXT GENERATED ALWAYS AS (
+    lower(host_name) || E'\n' || uuid_label::text || E'\n' || secseal::text || E'\n' ||
+    coalesce(ipv4_address, '') || E'\n' || lower(replace(mac_address, ':', ''))
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_computers_search_text ON computers USING gin (search_text gin_trgm_ops);
+
+-- Ranked full-text search over the descriptive columns of the computers. The pending list of the
+-- GIN index is disabled so that searches never have to scan it under concurrent writes.
+ALTER TABLE computers ADD COLUMN IF NOT EXISTS search_document TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', coalesce(host_name, '') || ' ' || uuid_label::text || ' ' || secseal::text || ' ' ||
+        coalesce(ipv4_address, '') || ' ' || coalesce(mac_address, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(user_name, '') || ' ' || coalesce(pc_serialnumber, '') || ' ' ||
+        coalesce(net_adapter_serialnumber, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(office_location, '') || ' ' || coalesce(office_number, '') || ' ' ||
+        coalesce(telephone, '') || ' ' || coalesce(yat, '') || ' ' || coalesce(make, '') || ' ' || coalesce(model, '')), 'C') ||
+    setweight(to_tsvector('simple', coalesce(network, '') || ' ' || coalesce(os, '') || ' ' || coalesce(network_adapter, '')), 'D')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_computers_search_document ON computers USING gin (search_document) WITH (fastupdate = off);
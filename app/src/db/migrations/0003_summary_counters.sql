@@ -0,0 +1,89 @@
+-- Summary counters of the dashboard and the list totals: the number of rows of each entity in total
+-- (dimension 'total') and per value of one column (computers per network, entries and tickets per status).
+-- They are kept current by statement-level triggers in the same transaction as the change, so reading
+-- a count is a primary key lookup whatever the size of the table.
+CREATE TABLE IF NOT EXISTS summary_counters (
+    entity VARCHAR(50) NOT NULL,
+    dimension VARCHAR(50) NOT NULL,
+    value VARCHAR(255) NOT NULL DEFAULT '',
+    count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (entity, dimension, value)
+);
+
+-- Applies the rows added and removed by a statement to the counters of the table. TG_ARGV[0] is the
+-- counted column. The counter rows are updated in key order, so concurrent writers do not deadlock.
+CREATE OR REPLACE FUNCTION maintain_summary_counters() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    changed_rows TEXT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        changed_rows := format('SELECT %I::text AS value, 1 AS delta FROM new_rows', TG_ARGV[0]);
+    ELSIF TG_OP = 'DELETE' THEN
+        changed_rows := format('SELECT %I::text AS value, -1 AS delta FROM old_rows', TG_ARGV[0]);
+    ELSE
+        changed_rows := format('SELECT %1$I::text AS value, 1 AS delta FROM new_rows UNION ALL SELECT %1$I::text, -1 FROM old_rows', TG_ARGV[0]);
+    END IF;
+
+    EXECUTE format($sql$
+        INSERT INTO summary_counters (entity, dimension, value, count)
+        SELECT %L, dimension, value, sum(delta) FROM (
+            SELECT 'total' AS dimension, '' AS value, delta FROM (%s) AS changed
+            UNION ALL
+            SELECT %L, coalesce(value, ''), delta FROM (%s) AS changed
+        ) AS deltas
+        GROUP BY dimension, value
+        HAVING sum(delta) <> 0
+        ORDER BY dimension, value
+        ON CONFLICT (entity, dimension, value) DO UPDATE SET count = summary_counters.count + EXCLUDED.count
+    $sql$, TG_TABLE_NAME, changed_rows, TG_ARGV[0], changed_rows);
+
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION reset_summary_counters() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM summary_counters WHERE entity = TG_TABLE_NAME;
+    RETURN NULL;
+END $$;
+
+-- Recounts every counter from the tables, e.g. after restoring data with the triggers disabled
+CREATE OR REPLACE FUNCTION rebuild_summary_counters() RETURNS void LANGUAGE sql AS $$
+    LOCK TABLE computers, entries, tickets IN SHARE MODE;
+    DELETE FROM summary_counters;
+    INSERT INTO summary_counters (entity, dimension, value, count)
+    SELECT 'computers', 'total', '', count(*) FROM computers
+    UNION ALL SELECT 'computers', 'network', network, count(*) FROM computers GROUP BY network
+    UNION ALL SELECT 'entries', 'total', '', count(*) FROM entries
+    UNION ALL SELECT 'entries', 'status', status, count(*) FROM entries GROUP BY status
+    UNION ALL SELECT 'tickets', 'total', '', count(*) FROM tickets
+    UNION ALL SELECT 'tickets', 'status', status, count(*) FROM tickets GROUP BY status;
+$$;
+
+CREATE OR REPLACE TRIGGER computers_counters_insert AFTER INSERT ON computers
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION maintain_summary_counters('network');
+CREATE OR REPLACE TRIGGER computers_counters_update AFTER UPDATE ON computers
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION maintain_summary_counters('network');
+CREATE OR REPLACE TRIGGER computers_counters_delete AFTER DELETE ON computers
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION maintain_summary_counters('network');
+CREATE OR REPLACE TRIGGER computers_counters_truncate AFTER TRUNCATE ON computers
+    FOR EACH STATEMENT EXECUTE FUNCTION reset_summary_counters();
+
+CREATE OR REPLACE TRIGGER entries_counters_insert AFTER INSERT ON entries
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION maintain_summary_counters('status');
+CREATE OR REPLACE TRIGGER entries_counters_update AFTER UPDATE ON entries
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION maintain_summary_counters('status');
+CREATE OR REPLACE TRIGGER entries_counters_delete AFTER DELETE ON entries
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION maintain_summary_counters('status');
+CREATE OR REPLACE TRIGGER entries_counters_truncate AFTER TRUNCATE ON entries
+    FOR EACH STATEMENT EXECUTE FUNCTION reset_summary_counters();
+
+CREATE OR REPLACE TRIGGER tickets_counters_insert AFTER INSERT ON tickets
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION maintain_summary_counters('status');
+CREATE OR REPLACE TRIGGER tickets_counters_update AFTER UPDATE ON tickets
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION maintain_summary_counters('status');
+CREATE OR REPLACE TRIGGER tickets_counters_delete AFTER DELETE ON tickets
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION maintain_summary_counters('status');
+CREATE OR REPLACE TRIGGER tickets_counters_truncate AFTER TRUNCATE ON tickets
+    FOR EACH STATEMENT EXECUTE FUNCTION reset_summary_counters();
+
+SELECT rebuild_summary_counters();
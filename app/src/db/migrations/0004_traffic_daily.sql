@@ -0,0 +1,35 @@
+-- Daily traffic (number of entries created per day and network of the computer) for /entries/traffic,
+-- maintained incrementally: every statement inserting entries adds its rows to their days.
+-- The network is the one of the computer when the entry was created.
+CREATE TABLE IF NOT EXISTS traffic_daily (
+    day DATE NOT NULL,
+    network VARCHAR(255) NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, network)
+);
+
+CREATE OR REPLACE FUNCTION maintain_traffic_daily() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO traffic_daily (day, network, count)
+    SELECT new_rows.created_at::date, computers.network, count(*)
+    FROM new_rows JOIN computers ON computers.uuid_label = new_rows.uuid_label
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    ON CONFLICT (day, network) DO UPDATE SET count = traffic_daily.count + EXCLUDED.count;
+    RETURN NULL;
+END $$;
+
+-- Recounts the daily traffic from the entries, e.g. to seed the table
+CREATE OR REPLACE FUNCTION rebuild_traffic_daily() RETURNS void LANGUAGE sql AS $$
+    LOCK TABLE entries IN SHARE MODE;
+    DELETE FROM traffic_daily;
+    INSERT INTO traffic_daily (day, network, count)
+    SELECT entries.created_at::date, computers.network, count(*)
+    FROM entries JOIN computers ON computers.uuid_label = entries.uuid_label
+    GROUP BY 1, 2;
+$$;
+
+CREATE OR REPLACE TRIGGER entries_traffic_insert AFTER INSERT ON entries
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION maintain_traffic_daily();
+
+SELECT rebuild_traffic_daily();
@@ -0,0 +1,12 @@
+-- migrate: no-transaction
+-- Indexes of the filtered access paths, built without blocking the writes to the tables.
+
+-- Recent jobs (status = 'open' OR closed within the last 24 hours): the open jobs are a small,
+-- shrinking part of the entries, a partial index keeps them in the sort order of the jobs page
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_entries_open_created_at ON entries (created_at DESC, uuid DESC) WHERE status = 'open';
+
+-- ... and the jobs closed recently are a range of signed_at among the closed ones
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_entries_closed_signed_at ON entries (signed_at) WHERE status = 'closed';
+
+-- Tickets filtered by status, newest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tickets_status_created_at ON tickets (status, created_at DESC, id DESC);
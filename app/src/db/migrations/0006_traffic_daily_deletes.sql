@@ -0,0 +1,59 @@
+-- Keeps the daily traffic current when entries are deleted or updated, and not only inserted: the rows
+-- removed by a statement are subtracted from their days, the rows it adds (or the new version of the
+-- updated ones) are added, as maintain_summary_counters does. A day left without entries is removed,
+-- as the live count did not return it.
+CREATE OR REPLACE FUNCTION maintain_traffic_daily() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    changed_rows TEXT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        changed_rows := 'SELECT uuid_label, created_at, 1 AS delta FROM new_rows';
+    ELSIF TG_OP = 'DELETE' THEN
+        changed_rows := 'SELECT uuid_label, created_at, -1 AS delta FROM old_rows';
+    ELSE
+        changed_rows := 'SELECT uuid_label, created_at, 1 AS delta FROM new_rows UNION ALL SELECT uuid_label, created_at, -1 FROM old_rows';
+    END IF;
+
+    EXECUTE format($sql$
+        INSERT INTO traffic_daily (day, network, count)
+        SELECT changed.created_at::date, computers.network, sum(changed.delta)
+        FROM (%s) AS changed JOIN computers ON computers.uuid_label = changed.uuid_label
+        GROUP BY 1, 2
+        HAVING sum(changed.delta) <> 0
+        ORDER BY 1, 2
+        ON CONFLICT (day, network) DO UPDATE SET count = traffic_daily.count + EXCLUDED.count
+    $sql$, changed_rows);
+
+    -- The table holds a row per day and network, scanning it is cheap
+    IF TG_OP <> 'INSERT' THEN
+        DELETE FROM traffic_daily WHERE count <= 0;
+    END IF;
+
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION reset_traffic_daily() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM traffic_daily;
+    RETURN NULL;
+END $$;
+
+-- The entries of a deleted computer are removed by ON DELETE CASCADE after the computer row, when the
+-- network they are counted under can no longer be read. They are deleted first instead, while it can.
+CREATE OR REPLACE FUNCTION delete_computer_entries() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM entries WHERE uuid_label = OLD.uuid_label;
+    RETURN OLD;
+END $$;
+
+CREATE OR REPLACE TRIGGER entries_traffic_update AFTER UPDATE ON entries
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION maintain_traffic_daily();
+CREATE OR REPLACE TRIGGER entries_traffic_delete AFTER DELETE ON entries
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION maintain_traffic_daily();
+CREATE OR REPLACE TRIGGER entries_traffic_truncate AFTER TRUNCATE ON entries
+    FOR EACH STATEMENT EXECUTE FUNCTION reset_traffic_daily();
+CREATE OR REPLACE TRIGGER computers_traffic_delete BEFORE DELETE ON computers
+    FOR EACH ROW EXECUTE FUNCTION delete_computer_entries();
+
+-- Recount, as the rollup may have been left too high by deletes made before this migration
+SELECT rebuild_traffic_daily();
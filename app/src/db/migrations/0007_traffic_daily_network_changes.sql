@@ -0,0 +1,36 @@
+-- The daily traffic counts the entries under the current network of their computer, as
+-- rebuild_traffic_daily() and the live count did: when a computer changes network, its entries
+-- are moved from the days of the old network to the days of the new one. Without this, the deletes
+-- and updates of its entries (counted under the current network) lowered the wrong rows.
+--
+-- Transition tables cannot be combined with a column list (UPDATE OF network), the computers whose
+-- network did not change are left out by the query.
+CREATE OR REPLACE FUNCTION move_traffic_daily() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO traffic_daily (day, network, count)
+    SELECT moved.day, moved.network, sum(moved.delta)
+    FROM (
+        SELECT entries.created_at::date AS day, old_rows.network, -1 AS delta
+        FROM old_rows JOIN new_rows ON new_rows.uuid_label = old_rows.uuid_label
+        JOIN entries ON entries.uuid_label = old_rows.uuid_label
+        WHERE old_rows.network IS DISTINCT FROM new_rows.network
+        UNION ALL
+        SELECT entries.created_at::date, new_rows.network, 1
+        FROM old_rows JOIN new_rows ON new_rows.uuid_label = old_rows.uuid_label
+        JOIN entries ON entries.uuid_label = new_rows.uuid_label
+        WHERE old_rows.network IS DISTINCT FROM new_rows.network
+    ) AS moved
+    GROUP BY 1, 2
+    HAVING sum(moved.delta) <> 0
+    ORDER BY 1, 2
+    ON CONFLICT (day, network) DO UPDATE SET count = traffic_daily.count + EXCLUDED.count;
+
+    DELETE FROM traffic_daily WHERE count <= 0;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE TRIGGER computers_traffic_update AFTER UPDATE ON computers
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION move_traffic_daily();
+
+-- Recount, as the rollup may hold entries under the network their computer had before
+SELECT rebuild_traffic_daily();
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, TIMESTAMP
-from sqlalchemy.orm import declarative_base
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, ForeignKey, TIMESTAMP, Date, Text, Computed
+from sqlalchemy.orm import declarative_base, deferred
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -32,6 +33,24 @@ class Computer(Base):
     office_number = Column(String(20))
     telephone = Column(String(20))
     office_location = Column(String(20))
+    # Normalized text of the searchable columns (lowercase, MAC address without colons), maintained by
+    # the database and covered by a trigram index for the generic search. Not loaded with the computer.
+    search_text = deferred(Column(Text, Computed(
+        "lower(host_name) || E'\\n' || uuid_label::text || E'\\n' || secseal::text || E'\\n' || "
+        "coalesce(ipv4_address, '') || E'\\n' || lower(replace(mac_address, ':', ''))",
+        persisted=True
+    )))
+    # Weighted full-text document of the descriptive columns, covered by a GIN index for the ranked search
+    search_document = deferred(Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('simple', coalesce(host_name, '') || ' ' || uuid_label::text || ' ' || secseal::text || ' ' || "
+        "coalesce(ipv4_address, '') || ' ' || coalesce(mac_address, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(user_name, '') || ' ' || coalesce(pc_serialnumber, '') || ' ' || "
+        "coalesce(net_adapter_serialnumber, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(office_location, '') || ' ' || coalesce(office_number, '') || ' ' || "
+        "coalesce(telephone, '') || ' ' || coalesce(yat, '') || ' ' || coalesce(make, '') || ' ' || coalesce(model, '')), 'C') || "
+        "setweight(to_tsvector('simple', coalesce(network, '') || ' ' || coalesce(os, '') || ' ' || coalesce(network_adapter, '')), 'D')",
+        persisted=True
+    )))
 
 class Entry(Base):
     __tablename__ = 'entries'
@@ -59,3 +78,20 @@ class Ticket(Base):
     client_name = Column(String, nullable=True)
     descr = Column(String, nullable=True)
     title = Column(String, nullable=False)
+
+class SummaryCounter(Base):
+    __tablename__ = 'summary_counters'
+
+    # Maintained by the database triggers of the counted tables, read only
+    entity = Column(String(50), primary_key=True)
+    dimension = Column(String(50), primary_key=True)
+    value = Column(String(255), primary_key=True, default='')
+    count = Column(BigInteger, nullable=False, default=0)
+
+class TrafficDaily(Base):
+    __tablename__ = 'traffic_daily'
+
+    # Maintained by the database triggers on the changes of entries and computer networks, read only
+    day = Column(Date, primary_key=True)
+    network = Column(String(255), primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,123 @@
+from sqlalchemy import tuple_, func, select
+import datetime
+import base64
+import json
+
+"""
+    This .py file contains the helpers of the keyset (cursor) pagination
+    used by the list endpoints.
+
+    A cursor is an opaque token holding the sort key of the last row of a page.
+    The next page starts right after that key, so it is read through the index
+    of the sort key instead of scanning and discarding all the previous rows.
+
+    Nullable sort columns are sorted as coalesce(column, 'infinity') (NULLs first,
+    as with a plain descending sort), and a NULL value is stored as 'infinity'.
+"""
+
+def encode_cursor(kind: str, values: list) -> str:
+    """
+    Encodes the sort key of a row into an opaque cursor.
+
+    Args:
+        kind (str): The listing (and sort order) the cursor belongs to, e.g. 'jobs:created_at'.
+        values (list): The values of the sort key, the unique tie-breaker last.
+
+    Returns:
+        str: The URL-safe cursor.
+    """
+    encoded = []
+    for value in values:
+        if isinstance(value, datetime.datetime):
+            encoded.append({"dt": value.isoformat()})
+        elif value is None:
+            encoded.append({"dt": "infinity"})
+        else:
+            encoded.append(value)
+
+    payload = json.dumps({"k": kind, "v": encoded}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(kind: str, cursor: str) -> list:
+    """
+    Decodes a cursor created by encode_cursor().
+
+    Raises:
+        ValueError: If the cursor is malformed or belongs to another listing.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if payload["k"] != kind:
+            raise ValueError
+        values = []
+        for value in payload["v"]:
+            if isinstance(value, dict):
+                value = value["dt"] if value["dt"] == "infinity" else datetime.datetime.fromisoformat(value["dt"])
+            elif not isinstance(value, (int, str)):
+                raise ValueError
+            values.append(value)
+        return values
+    except Exception:
+        raise ValueError(f"Invalid pagination cursor: {cursor}")
+
+def after_cursor(stmt, kind: str, columns: list, cursor: str = None):
+    """
+    Restricts a statement ordered descending by the given columns to the rows after the cursor.
+
+    Args:
+        stmt: The select statement.
+        kind (str): The listing the cursor must belong to.
+        columns (list): The columns (or expressions) of the descending sort key, the unique tie-breaker last.
+        cursor (str): The cursor of the previous page, None for the first page.
+
+    Returns:
+        The restricted statement.
+    """
+    if not cursor:
+        return stmt
+
+    values = decode_cursor(kind, cursor)
+    if len(values) != len(columns):
+        raise ValueError(f"Invalid pagination cursor: {cursor}")
+
+    return stmt.where(tuple_(*columns) < tuple_(*values))
+
+def next_cursor(kind: str, rows: list, keys: list, limit: int) -> str:
+    """
+    Returns the cursor of the page after the given one, None if it was the last page.
+
+    Args:
+        kind (str): The listing the cursor belongs to.
+        rows (list): The rows of the page, as dictionaries.
+        keys (list): The keys of the sort key values in the rows, the unique tie-breaker last.
+        limit (int): The page size, 0 if the page was not limited.
+    """
+    if limit <= 0 or len(rows) < limit:
+        return None
+
+    return encode_cursor(kind, [rows[-1][key] for key in keys])
+
+def fetch_with_total(db, stmt) -> tuple[list, int]:
+    """
+    Executes a (limited) statement and counts all the rows it matches in the same round trip,
+    with an uncorrelated count subquery of the statement without LIMIT/OFFSET.
+
+    The count is planned on its own (e.g. with bitmap scans of partial indexes), while the page
+    keeps its LIMIT plan. A count(*) OVER () window is planned as if the LIMIT also bounded the
+    count, which can turn a cheap count into a walk of the whole sort index.
+
+    Args:
+        db (Session): The database session.
+        stmt: The select statement of the page.
+
+    Returns:
+        tuple: The rows of the page (each also carrying the 'total' column) and the total number of matching rows.
+    """
+    count = select(func.count()).select_from(stmt.limit(None).offset(None).order_by(None).subquery()).correlate(None)
+
+    rows = db.execute(stmt.add_columns(count.scalar_subquery().label("total"))).all()
+    if rows:
+        return rows, rows[0].total
+
+    # An empty page (e.g. past the end) carries no count, the matching rows are counted separately
+    return rows, db.execute(count).scalar_one()
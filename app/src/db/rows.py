@@ -0,0 +1,40 @@
+"""
+    This .py file contains the helpers of the read path of the CRUD functions.
+
+    A read selects only the columns of its API schema, as plain Core rows, and turns
+    each row into a dictionary in one pass. No ORM object is built (nor added to the
+    identity map of the session), and the rows are not validated again by Pydantic:
+    they come straight from typed table columns.
+"""
+
+def schema_columns(model, schema, **overrides) -> list:
+    """
+    Returns the columns of a model matching the fields of a schema, in the order of the fields.
+
+    Args:
+        model: The ORM model the columns are read from.
+        schema: The Pydantic schema whose fields are selected.
+        overrides: Columns of the fields that are not read from the model (e.g. host_name=Computer.host_name of a join).
+    """
+    return [overrides[field] if field in overrides else getattr(model, field) for field in schema.model_fields]
+
+def schema_keys(schema) -> tuple:
+    """
+    Returns the keys of the dictionaries of a schema, in the order of schema_columns().
+    """
+    return tuple(schema.model_fields)
+
+def row_dicts(rows, keys: tuple) -> list[dict]:
+    """
+    Turns rows selected with schema_columns() into dictionaries.
+
+    The rows may carry extra columns after the schema ones (e.g. the 'total' of fetch_with_total()),
+    they are left out.
+    """
+    return [dict(zip(keys, row)) for row in rows]
+
+def row_dict(row, keys: tuple) -> dict:
+    """
+    Turns a single row selected with schema_columns() into a dictionary, None if there is no row.
+    """
+    return dict(zip(keys, row)) if row is not None else None
@@ -1,55 +1,240 @@
-from keycloak import KeycloakOpenID, KeycloakAdmin, KeycloakAuthenticationError, KeycloakGetError
-from flask import current_app, session
+from keycloak import KeycloakOpenID, KeycloakAdmin, KeycloakOpenIDConnection, KeycloakAuthenticationError, KeycloakGetError, KeycloakPostError, KeycloakDeleteError
+from flask import current_app, session, g
+from requests.adapters import HTTPAdapter
+from jwcrypto import jwk, jwt
+from cache import TTLCache
+from user_directory import directory
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import contextvars
 import datetime
+import hashlib
+import threading
+import time
+import json
 import uuid
 import re
 import logging
 
-def load_user_metadata() -> dict:
-    user_data = get_user_by_token(session['access_token'])
-
-    if "Helpdesk" in user_data.get("realm_access").get("roles"):
-        role = "Helpdesk"
-    elif "GPolicy" in user_data.get("realm_access").get("roles"):
-        role = "GPolicy"
-    elif "admin" in user_data.get("realm_access").get("roles"):
-        role = "Administrator"
+# State of the user directory synchronization: the time (Keycloak's clock, in milliseconds) of the last
+# admin event applied, None until a full listing has been taken, and when that listing was taken
+_directory_sync = {"events_since": None, "full_at": 0.0}
+
+# The admin events that may change a directory entry, and how many are read per call
+DIRECTORY_EVENT_TYPES = ["USER", "REALM_ROLE_MAPPING", "GROUP_MEMBERSHIP", "REALM_ROLE", "GROUP"]
+DIRECTORY_EVENTS_PAGE = 500
+# Past this number of changed users a full listing is taken instead, it costs fewer calls
+DIRECTORY_MAX_CHANGED_USERS = 200
+
+_USER_PATH = re.compile(r'^users/([0-9a-fA-F-]{36})(?:/|$)')
+
+# The realm's signing keys (JWKS) used for local token verification. They are fetched once
+# and re-fetched when they expire or when a token is signed with an unknown key (key rotation).
+_jwks_cache = {"keyset": None, "fetched_at": 0.0}
+_jwks_lock = threading.Lock()
+
+# Process-wide Keycloak clients, built once from the application settings and shared by all threads.
+_clients = {}
+_clients_lock = threading.Lock()
+
+# Counts the HTTP calls made to Keycloak on behalf of the current task, see count_keycloak_calls()
+_keycloak_calls = contextvars.ContextVar('keycloak_calls', default=None)
+
+# Introspection responses, keyed by the SHA-256 of the token so raw tokens are not kept in memory.
+_introspection_cache = TTLCache(maxsize=4096, ttl=30)
+
+# The realm role catalog (every realm role indexed by UUID and by name), see get_role_catalog()
+_role_catalog = TTLCache(maxsize=1, ttl=300)
+
+# Username to user UUID. Usernames are immutable in the realm, so entries are only dropped when the user is deleted.
+_user_ids = TTLCache(maxsize=10000, ttl=86400)
+
+def configure_caches(config: dict):
+    """
+    Sizes the in-process Keycloak caches from the application settings.
+    """
+    _introspection_cache.configure(maxsize=config['INTROSPECTION_CACHE_SIZE'], ttl=config['INTROSPECTION_CACHE_TTL'])
+    _role_catalog.configure(ttl=config['ROLE_CATALOG_TTL'])
+    _role_catalog.clear()
+    _user_ids.configure(maxsize=config['USER_ID_CACHE_SIZE'])
+
+def _display_role(roles: list) -> str:
+    if "Helpdesk" in roles:
+        return "Helpdesk"
+    elif "GPolicy" in roles:
+        return "GPolicy"
+    elif "admin" in roles:
+        return "Administrator"
     else:
-        role = "Undefined"
+        return "Undefined"
 
-    username = user_data.get("username")
-    fullname = user_data.get("name")
+def get_principal(access_token, introspect=False) -> dict:
+    """
+    Returns the principal (authenticated user) of the current request.
 
-    return {"role": role, "username": username, "fullname": fullname}
+    The token is verified at most once per request and the result is stored on flask.g, so the
+    auth decorators, load_user_metadata() and the templates all share a single Keycloak round trip.
+    A principal resolved without introspection is resolved again if introspect=True is requested.
 
-def initialize_admin_client() -> KeycloakAdmin:
+    Args:
+        access_token: The bearer or session token of the request.
+        introspect (bool): Require the token to be checked through Keycloak's introspection endpoint.
+
+    Returns:
+        dict: The principal with keys 'active', 'roles', 'role', 'username', 'fullname' and 'claims'.
     """
-    Initializes and returns a KeycloakAdmin client using the client service account. (If Enabled)
+    principal = g.get('principal')
+
+    if principal is None or principal['token'] != access_token or (introspect and not principal['introspected']):
+        claims = get_token_claims(access_token, introspect=introspect)
+        roles = claims.get("realm_access", {}).get("roles", [])
+
+        principal = g.principal = {
+            "token": access_token,
+            "introspected": introspect,
+            "active": bool(claims),
+            "roles": roles,
+            "role": _display_role(roles),
+            "username": claims.get("username"),
+            "fullname": claims.get("name"),
+            "claims": claims
+        }
+
+    return principal
+
+def load_user_metadata() -> dict:
+    principal = get_principal(session['access_token'])
+    return {"role": principal["role"], "username": principal["username"], "fullname": principal["fullname"]}
+
+class SharedOpenIDConnection(KeycloakOpenIDConnection):
+    """
+    A KeycloakOpenIDConnection that is safe to share between worker threads.
+
+    The service account token is cached by the connection and refreshed before it expires
+    (at 90% of its lifetime); the lock makes sure only one thread refreshes it at a time.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._token_lock = threading.RLock()
+        super().__init__(*args, **kwargs)
+
+    def refresh_token(self) -> None:
+        with self._token_lock:
+            super().refresh_token()
+
+    def _refresh_if_required(self) -> None:
+        if datetime.datetime.now(tz=datetime.timezone.utc) >= self.expires_at:
+            with self._token_lock:
+                # Another thread may have refreshed the token while this one was waiting
+                super()._refresh_if_required()
+
+class KeycloakCallCounter:
+    def __init__(self, parent=None):
+        self.calls = 0
+        self.parent = parent
+        self._lock = threading.Lock()
+
+    def increment(self):
+        with self._lock:
+            self.calls += 1
+        # Nested counters also count towards the enclosing ones
+        if self.parent is not None:
+            self.parent.increment()
+
+@contextmanager
+def count_keycloak_calls():
+    """
+    Counts the HTTP calls made to Keycloak through the shared clients inside the with-block,
+    including calls made by tasks submitted with a copy of the current context (see _run_pooled).
+
+    Yields:
+        KeycloakCallCounter: The counter, its 'calls' attribute holds the number of calls.
+    """
+    counter = KeycloakCallCounter(parent=_keycloak_calls.get())
+    reset_token = _keycloak_calls.set(counter)
+    try:
+        yield counter
+    finally:
+        _keycloak_calls.reset(reset_token)
+
+def _count_call(response, *args, **kwargs):
+    counter = _keycloak_calls.get()
+    if counter is not None:
+        counter.increment()
+
+def _mount_connection_pool(connection, pool_size: int):
+    # python-keycloak mounts adapters with the default pool of 10 connections, resize them and keep their retry policy
+    for protocol in ("https://", "http://"):
+        retries = connection._s.get_adapter(protocol).max_retries
+        connection._s.mount(protocol, HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries))
+    connection._s.hooks['response'].append(_count_call)
+
+def _run_pooled(function, items: list) -> list:
+    """
+    Calls function(item) for every item on a thread pool of at most KEYCLOAK_MAX_WORKERS threads.
+    Each task runs in a copy of the caller's context, so Keycloak calls are still counted.
 
     Returns:
-        KeycloakAdmin: An initialized KeycloakAdmin client
+        list: The results, in the order of the items.
     """
-    config = current_app.config['settings']
-    
+    if not items:
+        return []
+
+    max_workers = min(current_app.config['settings']['KEYCLOAK_MAX_WORKERS'], len(items))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, function, item) for item in items]
+        return [future.result() for future in futures]
+
+def _get_client(name, build):
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = build(current_app.config['settings'])
+    return client
+
+def _build_admin_client(config) -> KeycloakAdmin:
     try:
-        keycloak_admin = KeycloakAdmin(
+        connection = SharedOpenIDConnection(
             server_url=config['KEYCLOAK_URL'],
             realm_name=config['REALM_NAME'],
             client_id=config['KEYCLOAK_CLIENT_ID'],
             client_secret_key=config['KEYCLOAK_CLIENT_SECRET'],
+            timeout=config['KEYCLOAK_TIMEOUT'],
             verify=True
         )
-        return keycloak_admin
+        _mount_connection_pool(connection, config['KEYCLOAK_POOL_SIZE'])
+        return KeycloakAdmin(connection=connection)
     except Exception as e:
-        raise RuntimeError(f'Failed to generate token and initialize KeycloakAdmin: {str(e)}')
+        raise RuntimeError(f'Failed to initialize KeycloakAdmin: {str(e)}')
 
-def get_user_roles(user_id: str, keycloak_admin: KeycloakAdmin):
+def initialize_admin_client() -> KeycloakAdmin:
+    """
+    Returns the process-wide KeycloakAdmin client that uses the client service account. (If Enabled)
+
+    The client is built once and keeps a pool of keep-alive connections to Keycloak. Its service
+    account token is requested on first use and refreshed before it expires, not on every call.
+
+    Returns:
+        KeycloakAdmin: An initialized KeycloakAdmin client
+    """
+    return _get_client('admin', _build_admin_client)
+
+def reset_clients():
+    """
+    Drops the shared Keycloak clients, they are rebuilt from the settings on next use.
+    """
+    with _clients_lock:
+        _clients.clear()
+
+def get_user_roles(user_id: str, keycloak_admin: KeycloakAdmin = None):
     """
     Fetches the roles assigned to a user with the given user_id using KeycloakAdmin object.
 
     Args:
         user_id (str): The ID of the user whose roles are to be fetched.
-        keycloak_admin (KeycloakAdmin): The keycloak admin object that is already initialized.
+        keycloak_admin (KeycloakAdmin): The keycloak admin object that is already initialized. Defaults to the shared admin client.
 
     Returns:
         A list of roles assigned to the user.
@@ -58,6 +243,7 @@ def get_user_roles(user_id: str, keycloak_admin: KeycloakAdmin):
         Exception: If an error occurs.
     """
     try:
+        keycloak_admin = keycloak_admin or initialize_admin_client()
         realm_roles = keycloak_admin.get_realm_roles_of_user(user_id) 
 
         if not realm_roles:
@@ -73,13 +259,51 @@ def get_user_roles(user_id: str, keycloak_admin: KeycloakAdmin):
     except Exception as e:
         return []
 
-def get_users_from_keycloak(offset: int, limit: int) -> list:
+def get_users_roles(user_ids: list, keycloak_admin: KeycloakAdmin) -> dict:
+    """
+    Fetches the roles assigned to many users at once.
+
+    Role membership is read set-wise: the members of each realm role are fetched once and joined
+    in memory, so the number of Keycloak calls depends on the number of roles, not of users.
+    When that costs more calls than per-user lookups (small pages), or fails, the roles are
+    fetched per user on a bounded thread pool.
+
+    Args:
+        user_ids (list): The IDs of the users.
+        keycloak_admin (KeycloakAdmin): The keycloak admin object that is already initialized.
+
+    Returns:
+        dict: The role names of each user, in the same form as get_user_roles().
+    """
+    if not user_ids:
+        return {}
+
+    try:
+        role_names = [name for name in get_role_catalog()["by_name"] if name != 'default-roles-master']
+
+        if len(role_names) < len(user_ids):
+            roles_by_user = {user_id: [] for user_id in user_ids}
+            for role_name in role_names:
+                members = keycloak_admin.get_realm_role_members(role_name, query={"briefRepresentation": True})
+                for member in members:
+                    if member['id'] in roles_by_user:
+                        roles_by_user[member['id']].append(role_name)
+            return roles_by_user
+
+    except Exception as e:
+        logging.debug(f'Set-wise role lookup failed, falling back to per-user lookups: {str(e)}')
+
+    roles = _run_pooled(lambda user_id: get_user_roles(user_id, keycloak_admin), user_ids)
+    return dict(zip(user_ids, roles))
+
+def get_users_from_keycloak(offset: int, limit: int, search: str = None) -> list:
     """
     Retrieves a list of users from Keycloak with pagination and additional user details.
 
     Args:
         offset (int): The starting index for the users to retrieve (default is 0).
         limit (int): The maximum number of users to retrieve (default is 50).
+        search (str): Only return users whose username, name or email contain this text (optional).
 
     Returns:
         A list of user dictionaries containing user details.
@@ -100,12 +324,19 @@ def get_users_from_keycloak(offset: int, limit: int) -> list:
         else:
             query={"first": offset, "max": limit}
 
-        users = keycloak_admin.get_users(query=query)
+        if search:
+            query["search"] = search
+
+        with count_keycloak_calls() as counter:
+            users = keycloak_admin.get_users(query=query)
+            roles_by_user = get_users_roles([user['id'] for user in users], keycloak_admin)
+
+        logging.debug(f'Listed {len(users)} users with {counter.calls} Keycloak calls')
 
         result = []
         for user in users:
             creation_date = convert_iat_to_date(user['createdTimestamp'])
-            filtered_roles = get_user_roles(user_id=user['id'], keycloak_admin=keycloak_admin)
+            filtered_roles = roles_by_user.get(user['id'], [])
             
             active_status = user.get('enabled', False)
             user_info = {
@@ -125,6 +356,198 @@ def get_users_from_keycloak(offset: int, limit: int) -> list:
     except RuntimeError as re:
         raise RuntimeError(f"Failed to fetch users from Keycloak: {str(re)}")
 
+def _latest_admin_event(keycloak_admin: KeycloakAdmin) -> int:
+    """
+    Returns the time of the latest admin event of the realm, None if the realm does not save admin events.
+    """
+    realm = keycloak_admin.get_realm(keycloak_admin.connection.realm_name)
+    if not realm.get("adminEventsEnabled", False):
+        return None
+
+    events = keycloak_admin.get_admin_events(query={"first": 0, "max": 1})
+    return events[0]["time"] if events else 0
+
+def _changed_users(keycloak_admin: KeycloakAdmin, since: int) -> tuple[set, int]:
+    """
+    Reads the admin events after the given time, newest first.
+
+    Returns:
+        tuple: The IDs of the users they changed, None if they may have changed any user (a role or a group changed,
+            or more than DIRECTORY_MAX_CHANGED_USERS users), and the time of the latest event.
+    """
+    # dateFrom is a day of Keycloak's timezone, start the day before and filter on the event times
+    date_from = (datetime.datetime.fromtimestamp(since / 1000, tz=datetime.timezone.utc) - datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+    user_ids, latest, first = set(), since, 0
+
+    while True:
+        events = keycloak_admin.get_admin_events(query={
+            "resourceTypes": DIRECTORY_EVENT_TYPES, "dateFrom": date_from, "first": first, "max": DIRECTORY_EVENTS_PAGE
+        })
+
+        for event in events:
+            if event["time"] <= since:
+                return user_ids, latest
+            latest = max(latest, event["time"])
+
+            match = _USER_PATH.match(event.get("resourcePath") or "")
+            if match is None:
+                return None, latest
+            user_ids.add(match.group(1))
+            if len(user_ids) > DIRECTORY_MAX_CHANGED_USERS:
+                return None, latest
+
+        if len(events) < DIRECTORY_EVENTS_PAGE:
+            return user_ids, latest
+        first += DIRECTORY_EVENTS_PAGE
+
+def _get_user_or_none(user_id: str, keycloak_admin: KeycloakAdmin) -> dict:
+    try:
+        return keycloak_admin.get_user(user_id)
+    except KeycloakGetError as e:
+        if e.response_code == 404:
+            return None
+        raise
+
+def sync_user_directory() -> dict:
+    """
+    Synchronizes the local user directory with Keycloak.
+
+    Between full listings of the realm users, only the users named by the admin events since the last
+    sync are read again, so the cost of a sync follows the number of changes and not the size of the realm.
+    A full listing is taken on the first sync, every USER_DIRECTORY_FULL_SYNC_INTERVAL seconds, when the
+    events may have changed any user (a role or a group changed, or too many users), and on every sync if
+    the realm does not save admin events (Realm settings > Events > Admin events settings) or they cannot
+    be read by the service account (view-events role).
+
+    Returns:
+        dict: The number of directory entries that were added, updated and removed.
+    """
+    keycloak_admin = initialize_admin_client()
+    since = _directory_sync["events_since"]
+    full_interval = current_app.config['settings']['USER_DIRECTORY_FULL_SYNC_INTERVAL']
+
+    if since is not None and time.time() - _directory_sync["full_at"] < full_interval:
+        try:
+            user_ids, latest = _changed_users(keycloak_admin, since)
+        except Exception as e:
+            logging.warning(f'Admin events could not be read, the user directory is fully synchronized: {str(e)}')
+            user_ids = None
+
+        if user_ids is not None:
+            users = [user for user in _run_pooled(lambda user_id: _get_user_or_none(user_id, keycloak_admin), list(user_ids)) if user]
+            roles_by_user = get_users_roles([user['id'] for user in users], keycloak_admin)
+            stats = directory.apply(
+                [_user_info(user, roles_by_user.get(user['id'], [])) for user in users],
+                list(user_ids - {user['id'] for user in users})
+            )
+            _directory_sync["events_since"] = latest
+            return stats
+
+    # Read before the listing: the changes made while it is taken are applied again by the next sync
+    try:
+        latest = _latest_admin_event(keycloak_admin)
+    except Exception as e:
+        logging.warning(f'Admin events could not be read, the user directory is fully synchronized on every sync: {str(e)}')
+        latest = None
+
+    stats = directory.replace(get_users_from_keycloak(offset=0, limit=0))
+    _directory_sync.update(events_since=latest, full_at=time.time())
+    return stats
+
+def search_users(search: str = None, offset: int = 0, limit: int = 0) -> tuple[list, int]:
+    """
+    Searches users by username or name, with pagination and the total number of matches.
+
+    Users are served from the local user directory when its background synchronization is
+    enabled (USER_DIRECTORY_SYNC_INTERVAL > 0), otherwise Keycloak is queried directly.
+
+    Returns:
+        tuple: The requested page of users (same form as get_users_from_keycloak) and the total number of matching users.
+
+    Raises:
+        ValueError: If invalid values for offset or limit are provided.
+    """
+    if limit < 0 or offset < 0:
+        raise ValueError("Limit and offset must be greater than 0.")
+
+    if current_app.config['settings']['USER_DIRECTORY_SYNC_INTERVAL'] > 0:
+        if directory.synced_at is None:
+            sync_user_directory()
+        return directory.search(search, offset=offset, limit=limit)
+
+    users = get_users_from_keycloak(offset=offset, limit=limit, search=search)
+    total = initialize_admin_client().users_count(query={"search": search} if search else None)
+    return users, total
+
+def resolve_user_id(user_id: str, keycloak_admin: KeycloakAdmin = None, refresh: bool = False) -> str:
+    """
+    Resolves a username or a UUID to the user's UUID.
+
+    Usernames are resolved through the user directory and a bounded cache, so lookups by username
+    cost the same as lookups by UUID once the username has been seen. Both may be a sync interval
+    out of date: a caller that finds no user under the returned UUID resolves it again with refresh=True.
+
+    Args:
+        user_id (str): The UUID or the username of the user.
+        keycloak_admin (KeycloakAdmin): The keycloak admin object that is already initialized. Defaults to the shared admin client.
+        refresh (bool): Drop what the directory and the cache hold for the username and ask Keycloak.
+
+    Returns:
+        str: The UUID of the user, None if there is no user with the given username.
+    """
+    if is_valid_uuid(user_id):
+        return user_id
+
+    known = directory.get(user_id)
+    if known is not None and refresh:
+        directory.remove(known["id"])
+    elif known is not None:
+        return known["id"]
+
+    if refresh:
+        forget_user_id(user_id)
+
+    keycloak_admin = keycloak_admin or initialize_admin_client()
+
+    # Unknown usernames are not cached, the user may be created at any time
+    return _user_ids.get_or_load(
+        user_id,
+        lambda: keycloak_admin.get_user_id(user_id),
+        ttl=lambda resolved: None if resolved else 0
+    )
+
+def _fetch_user(user_id: str, keycloak_admin: KeycloakAdmin) -> dict:
+    """
+    Returns the Keycloak representation of the user with the given UUID or username, None if there is none.
+    A username that resolves to a user that no longer exists is resolved again through Keycloak.
+    """
+    resolved = resolve_user_id(user_id, keycloak_admin)
+    if resolved is None:
+        return None
+
+    try:
+        return keycloak_admin.get_user(resolved)
+    except KeycloakGetError as e:
+        if e.response_code != 404:
+            raise
+        if is_valid_uuid(user_id):
+            return None
+
+    resolved = resolve_user_id(user_id, keycloak_admin, refresh=True)
+    return keycloak_admin.get_user(resolved) if resolved else None
+
+def forget_user_id(user_id: str):
+    """
+    Drops a user from the username to UUID cache, e.g. when the user is deleted.
+
+    Args:
+        user_id (str): The username, or the UUID of the user: every username cached for it is then dropped.
+    """
+    if is_valid_uuid(user_id):
+        _user_ids.pop_value(user_id)
+    else:
+        _user_ids.pop(user_id)
+
 def is_valid_uuid(s: str) -> bool:
     try:
         # Try converting the string to a UUID object
@@ -141,107 +564,212 @@ def convert_iat_to_date(timestamp: float) -> datetime:
         return None
 
 def username_unique(username):
+    # Keycloak is always asked: the local directory may be a sync interval out of date either way
     keycloak_admin = initialize_admin_client()
-    # Check for existing users with the same username
+    # Check for existing users with the same username (usernames are stored in lowercase)
     existing_users = keycloak_admin.get_users({
         "username": username
     })
 
-    if existing_users:
+    if any(user.get("username") == username.lower() for user in existing_users):
         raise ValueError(f"A user with the username '{username}' already exists.")
 
-def initialize_keycloak_openid() -> KeycloakOpenID:
-    config = current_app.config['settings']
-    return KeycloakOpenID(
+    # A user the directory still holds was deleted since its last sync
+    stale = directory.get(username.lower())
+    if stale is not None:
+        directory.remove(stale["id"])
+
+def _build_keycloak_openid(config) -> KeycloakOpenID:
+    keycloak_openid = KeycloakOpenID(
         server_url=config['KEYCLOAK_URL'],
         client_id=config['KEYCLOAK_CLIENT_ID'],
         realm_name=config['REALM_NAME'],
         client_secret_key=config['KEYCLOAK_CLIENT_SECRET'],
+        timeout=config['KEYCLOAK_TIMEOUT'],
         verify=True
     )
+    _mount_connection_pool(keycloak_openid.connection, config['KEYCLOAK_POOL_SIZE'])
+    return keycloak_openid
 
-def introspect_admin_token(access_token) -> bool:
+def initialize_keycloak_openid() -> KeycloakOpenID:
     """
-    Introspects the given access token to check if it's valid and active.
-    It also checks if the user has admin role.
+    Returns the process-wide KeycloakOpenID client, built once from the application settings.
+    """
+    return _get_client('openid', _build_keycloak_openid)
+
+def get_realm_jwks(force_refresh=False) -> jwk.JWKSet:
+    """
+    Returns the JSON Web Key Set of the realm, fetching it from Keycloak only when the cached
+    copy is older than JWKS_CACHE_TTL seconds.
+
+    Args:
+        force_refresh (bool): Re-fetch the keys even if the cached copy has not expired, e.g. when a
+            token references an unknown key ID. Forced refreshes are limited to one every
+            JWKS_MIN_REFRESH_INTERVAL seconds, so tokens with bogus key IDs cannot hammer Keycloak.
 
     Returns:
-        True if the token is valid and admin, False if the token is invalid or expired or not admin or an exception occurs.
+        JWKSet: The public keys of the realm.
+    """
+    config = current_app.config['settings']
+
+    with _jwks_lock:
+        age = time.monotonic() - _jwks_cache["fetched_at"]
+        expired = _jwks_cache["keyset"] is None or age >= config['JWKS_CACHE_TTL']
+
+        if expired or (force_refresh and age >= config['JWKS_MIN_REFRESH_INTERVAL']):
+            certs = initialize_keycloak_openid().certs()
+            _jwks_cache["keyset"] = jwk.JWKSet.from_json(json.dumps(certs))
+            _jwks_cache["fetched_at"] = time.monotonic()
+
+        return _jwks_cache["keyset"]
+
+def _verify_jwt(access_token, keyset) -> dict:
+    token = jwt.JWT(check_claims={"exp": None}, expected_type="JWS")
+    # Keycloak issues short-lived tokens, do not accept them past their expiry
+    token.leeway = 0
+    token.deserialize(access_token, key=keyset)
+    return json.loads(token.claims)
+
+def decode_access_token(access_token) -> dict:
+    """
+    Verifies the given access token locally: signature against the realm JWKS, expiry, type, issuer and audience.
+
+    Only access tokens ('typ' Bearer) issued by the realm (TOKEN_ISSUER) are accepted, not the ID or
+    refresh tokens the realm also signs. The audience check accepts the token if TOKEN_AUDIENCE is listed in its 'aud' claim or is the
+    client the token was issued to ('azp'). An empty TOKEN_AUDIENCE disables the check.
+
+    Returns:
+        dict: The token claims, shaped like an introspection response ('active' and 'username' are set).
+
+    Raises:
+        ValueError: If the token is malformed, expired, badly signed, not an access token, or issued by another issuer or for another audience.
     """
+    config = current_app.config['settings']
+
     try:
-        keycloak_openid = initialize_keycloak_openid()
-        introspect_response = keycloak_openid.introspect(access_token)
-        
-        # Check if the token is active and user has admin role
-        if introspect_response.get("active", False):
-            if (introspect_response.get("realm_access", False)):
-                if ("admin" in introspect_response["realm_access"]["roles"]):
-                    return True
-                else:
-                    return False
-            else:
-                return False
-        else:
-            return False
+        try:
+            claims = _verify_jwt(access_token, get_realm_jwks())
+        except jwt.JWTMissingKey:
+            # The realm keys may have been rotated since they were cached
+            claims = _verify_jwt(access_token, get_realm_jwks(force_refresh=True))
     except Exception as e:
-        return False
-    
-def introspect_gpolicy_token(access_token) -> bool:
+        raise ValueError(f"Token verification failed: {str(e)}")
+
+    if claims.get("typ") != "Bearer":
+        raise ValueError(f"Token is not an access token (typ '{claims.get('typ')}')")
+    if claims.get("iss") != config['TOKEN_ISSUER']:
+        raise ValueError(f"Token was not issued by '{config['TOKEN_ISSUER']}'")
+
+    audience = config['TOKEN_AUDIENCE']
+    if audience:
+        token_audience = claims.get("aud", [])
+        if isinstance(token_audience, str):
+            token_audience = [token_audience]
+        if audience not in token_audience and claims.get("azp") != audience:
+            raise ValueError(f"Token was not issued for audience '{audience}'")
+
+    claims["active"] = True
+    claims.setdefault("username", claims.get("preferred_username"))
+    return claims
+
+def _token_key(access_token) -> str:
+    return hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+
+def _introspection_ttl(response) -> float:
+    # Cache until the token expires, but never longer than the configured maximum.
+    # Inactive tokens never become active again, so they are kept for the maximum.
+    max_ttl = _introspection_cache.ttl
+    if response.get("active", False) and response.get("exp"):
+        return min(response["exp"] - time.time(), max_ttl)
+    return max_ttl
+
+def get_introspection(access_token, refresh=False) -> dict:
     """
-    Introspects the given access token to check if it's valid and active.
-    It also checks if the user has admin role.
+    Returns Keycloak's introspection response for the given token, served from the introspection cache when possible.
+
+    Concurrent requests presenting the same uncached token share a single introspection call.
+
+    Args:
+        access_token: The token to introspect.
+        refresh (bool): Skip the cached response and ask Keycloak (the cache is then updated).
 
     Returns:
-        True if the token is valid and admin, False if the token is invalid or expired or not admin or an exception occurs.
+        dict: The introspection response.
+    """
+    key = _token_key(access_token)
+
+    if refresh:
+        response = initialize_keycloak_openid().introspect(access_token)
+        _introspection_cache.set(key, response, _introspection_ttl(response))
+        return response
+
+    return _introspection_cache.get_or_load(
+        key,
+        lambda: initialize_keycloak_openid().introspect(access_token),
+        ttl=_introspection_ttl
+    )
+
+def forget_token(access_token):
+    """
+    Drops the cached introspection response of a token, e.g. on logout.
+    """
+    if access_token:
+        _introspection_cache.pop(_token_key(access_token))
+
+def get_token_claims(access_token, introspect=False) -> dict:
+    """
+    Returns the claims of the given access token if it is valid and active.
+
+    The token is verified according to the TOKEN_VERIFICATION setting: 'local' checks the JWT
+    signature against the cached realm keys, 'introspection' asks Keycloak. Revocation-sensitive
+    callers can pass introspect=True to always ask Keycloak.
+
+    Returns:
+        dict: The claims (or introspection response), an empty dict if the token is invalid, expired or an exception occurs.
     """
     try:
-        keycloak_openid = initialize_keycloak_openid()
-        introspect_response = keycloak_openid.introspect(access_token)
-        
-        # Check if the token is active and user has admin role
-        if introspect_response.get("active", False):
-            if (introspect_response.get("realm_access", False)):
-                if ("admin" in introspect_response["realm_access"]["roles"] or "GPolicy" in introspect_response["realm_access"]["roles"]):
-                    return True
-                else:
-                    return False
-            else:
-                return False
+        if introspect or current_app.config['settings']['TOKEN_VERIFICATION'] != 'local':
+            response = get_introspection(access_token, refresh=introspect)
         else:
-            return False
+            response = decode_access_token(access_token)
+
+        return response if response.get("active", False) else {}
     except Exception as e:
-        return False
+        return {}
+
+def introspect_admin_token(access_token, introspect=False) -> bool:
+    """
+    Checks if the given access token is valid and active.
+    It also checks if the user has admin role.
+
+    Returns:
+        True if the token is valid and admin, False if the token is invalid or expired or not admin or an exception occurs.
+    """
+    return "admin" in get_principal(access_token, introspect=introspect)["roles"]
+    
+def introspect_gpolicy_token(access_token, introspect=False) -> bool:
+    """
+    Checks if the given access token is valid and active.
+    It also checks if the user has admin or GPolicy role.
+
+    Returns:
+        True if the token is valid and admin or GPolicy, False if the token is invalid or expired or has neither role or an exception occurs.
+    """
+    roles = get_principal(access_token, introspect=introspect)["roles"]
+    return "admin" in roles or "GPolicy" in roles
 
 def get_user_by_token(access_token):
     """
-    Introspects the given access token to return the user information if the token is active
-    Returns the user json if the token is valid, False if the token is invalid or expired.
+    Returns the user information (token claims) if the token is active, an empty dict if the token is invalid or expired.
     """
-    try:
-        keycloak_openid = initialize_keycloak_openid()
-        introspect_response = keycloak_openid.introspect(access_token)
-        if introspect_response.get("active", False):
-            return introspect_response
-        else:
-            return {}
-    except Exception as e:
-        return False
+    return get_principal(access_token)["claims"]
 
-def introspect_token(access_token):
+def introspect_token(access_token, introspect=False):
     """
-    Introspects the given access token to check if it's valid and active.
+    Checks if the given access token is valid and active.
     Returns True if the token is valid, False if the token is invalid or expired.
     """
-    try:
-        keycloak_openid = initialize_keycloak_openid()
-        introspect_response = keycloak_openid.introspect(access_token)
-        # Check if the token is active
-        if introspect_response.get("active", False):
-            return True
-        else:
-            return False
-    except Exception as e:
-        return False
+    return get_principal(access_token, introspect=introspect)["active"]
 
 def refresh_access_token(refresh_token):
     """
@@ -367,6 +895,34 @@ def init_admin_client(username, password):
     except Exception as e:
         raise RuntimeError(f'Failed to generate token and initialize KeycloakAdmin: {str(e)}')
 
+def _load_role_catalog() -> dict:
+    roles = initialize_admin_client().get_realm_roles(brief_representation=True)
+
+    return {
+        "roles": roles,
+        "by_id": {role['id']: role for role in roles},
+        "by_name": {role['name']: role for role in roles}
+    }
+
+def get_role_catalog() -> dict:
+    """
+    Returns the realm role catalog: the list of the realm roles ('roles') and the same roles
+    indexed by UUID ('by_id') and by name ('by_name').
+
+    Realm roles rarely change, so the catalog is fetched once and kept for ROLE_CATALOG_TTL seconds.
+    Operations that create or delete realm roles drop it with invalidate_role_catalog().
+
+    Raises:
+        Exception: If the realm roles cannot be fetched.
+    """
+    return _role_catalog.get_or_load("realm", _load_role_catalog)
+
+def invalidate_role_catalog():
+    """
+    Drops the cached realm role catalog, it is fetched again on next use.
+    """
+    _role_catalog.clear()
+
 def get_role(role_id):
     """
     Fetches the role by ID from the Realm
@@ -375,17 +931,17 @@ def get_role(role_id):
     :return: The role representation
     """
     try:
-        keycloak_admin = initialize_admin_client()  
+        catalog = get_role_catalog()
 
         if is_valid_uuid(role_id):
-            role_rep = keycloak_admin.get_realm_role_by_id(role_id)
+            role_rep = catalog["by_id"].get(role_id)
         else:
-            role_rep = keycloak_admin.get_realm_role(role_id)
+            role_rep = catalog["by_name"].get(role_id)
             
         if not role_rep:
             return None
 
-        return role_rep
+        return dict(role_rep)
     
     except Exception as e:
         return None
@@ -396,18 +952,13 @@ def get_realm_roles():
     """
     
     try:
-        keycloak_admin = initialize_admin_client()
-
-        roles = keycloak_admin.get_realm_roles(brief_representation=True)
-
-        for role in roles:
-            logging.debug(role)
+        roles = get_role_catalog()["roles"]
 
         # Define a set of roles to exclude
         roles_to_exclude = {'offline_access', 'uma_authorization', 'create-realm', 'default-roles-master'}
 
         # Filter the roles, excluding those in the roles_to_exclude set
-        filtered_roles = [role for role in roles if role['name'] not in roles_to_exclude]
+        filtered_roles = [dict(role) for role in roles if role['name'] not in roles_to_exclude]
 
         return filtered_roles
 
@@ -472,6 +1023,102 @@ def create_user_with_password(
         logging.error(e)
         return None
 
+def create_users(users: list) -> list:
+    """
+    Creates many users at once, each with a password and optionally realm roles.
+
+    Username uniqueness is checked against a single listing of the realm users (and within the
+    batch itself), the requested roles are resolved from the role catalog, and the users are then
+    created concurrently on at most KEYCLOAK_MAX_WORKERS threads. Each user is created with its
+    password in one call, plus one call to assign its roles.
+
+    Args:
+        users (list): The users to create, dicts with 'username', 'firstName', 'lastName', 'password',
+            and optionally 'enabled' (default True) and 'roles' (UUIDs or names of realm roles).
+
+    Returns:
+        list: One result per requested user, in the same order. Each result has the 'username', 'success'
+            and either the created 'user' representation or the 'error' that prevented its creation.
+
+    Raises:
+        RuntimeError: If the existing users cannot be listed.
+    """
+    keycloak_admin = initialize_admin_client()
+
+    try:
+        existing = {user['username'] for user in keycloak_admin.get_users(query={"briefRepresentation": True})}
+    except Exception as e:
+        raise RuntimeError(f"Failed to list the existing users: {str(e)}")
+
+    results = [None] * len(users)
+    pending = []
+    for index, user in enumerate(users):
+        # Usernames are stored in lowercase
+        username = user['username'].lower()
+
+        if username in existing:
+            results[index] = {"username": user['username'], "success": False, "error": f"A user with the username '{user['username']}' already exists."}
+            continue
+
+        roles = [get_role(role) for role in user.get('roles') or []]
+        missing = [role for role, rep in zip(user.get('roles') or [], roles) if rep is None]
+        if missing:
+            results[index] = {"username": user['username'], "success": False, "error": f"The following roles were not found: {', '.join(missing)}"}
+            continue
+
+        existing.add(username)
+        pending.append((index, user, roles))
+
+    def create(item):
+        index, user, roles = item
+        payload = {
+            "username": user['username'],
+            "firstName": user['firstName'],
+            "lastName": user['lastName'],
+            "enabled": user.get('enabled', True),
+            "attributes": {},
+            "credentials": [{"type": "password", "value": user['password'], "temporary": False}]
+        }
+
+        try:
+            user_id = keycloak_admin.create_user(payload=payload, exist_ok=False)
+        except KeycloakPostError as e:
+            if e.response_code == 409:
+                return {"username": user['username'], "success": False, "error": f"A user with the username '{user['username']}' already exists."}
+            return {"username": user['username'], "success": False, "error": f"Failed to create user: {str(e)}"}
+        except Exception as e:
+            return {"username": user['username'], "success": False, "error": f"Failed to create user: {str(e)}"}
+
+        error = None
+        if roles:
+            try:
+                keycloak_admin.assign_realm_roles(user_id, roles)
+            except Exception as e:
+                error = f"User created, but the roles could not be assigned: {str(e)}"
+
+        user_info = _user_info({
+            **payload,
+            "id": user_id,
+            "createdTimestamp": time.time() * 1000
+        }, [] if error else [role['name'] for role in roles if role['name'] != 'default-roles-master'])
+        user_info["username"] = user_info["username"].lower()
+        directory.upsert(user_info)
+
+        result = {"username": user['username'], "success": error is None, "user": user_info}
+        if error:
+            result["error"] = error
+        return result
+
+    with count_keycloak_calls() as counter:
+        created = _run_pooled(create, pending)
+
+    logging.debug(f'Provisioned {len(pending)} users with {counter.calls} Keycloak calls')
+
+    for (index, _, _), result in zip(pending, created):
+        results[index] = result
+
+    return results
+
 def update_user(
         user_id, 
         first_name=None, 
@@ -510,13 +1157,9 @@ def update_user(
         if enabled is not None:
             user_data['enabled'] = enabled
         
-        # Support both selecting user by UUID and by Username
-        if not is_valid_uuid(user_id):
-            user_id = keycloak_admin.get_user_id(user_id)
-
-        keycloak_admin.update_user(user_id, user_data)
+        keycloak_admin.update_user(user_repr['id'], user_data)
 
-        updated_user_json = get_user(user_id=user_id)
+        updated_user_json = get_user(user_id=user_repr['id'])
         
         return updated_user_json
     
@@ -527,6 +1170,21 @@ def update_user(
     except Exception as e:
         return None
 
+def _user_info(user_representation: dict, roles: list) -> dict:
+    """
+    Builds the user representation returned by the API from the Keycloak one and the user's role names.
+    """
+    return {
+        "username": user_representation.get("username"),
+        "email": user_representation.get("email"),
+        "fullname": f"{user_representation.get('firstName', '')} {user_representation.get('lastName', '')}".strip(),
+        "joined_date": convert_iat_to_date(user_representation['createdTimestamp']),
+        "id": user_representation.get("id"),
+        "roles": roles,
+        "active": user_representation.get('enabled', False),
+        "email_verified": user_representation.get('emailVerified', False)
+    }
+
 def get_user(user_id=None):
     """
     Retrieve a user from Keycloak by user ID.
@@ -542,31 +1200,13 @@ def get_user(user_id=None):
         keycloak_admin = initialize_admin_client()
 
         #Support both searching by UUID and by Username
-        if is_valid_uuid(user_id):
-            user_representation = keycloak_admin.get_user(user_id)
-        else:
-            id= keycloak_admin.get_user_id(user_id)
-            user_representation= keycloak_admin.get_user(id)
+        user_representation = _fetch_user(user_id, keycloak_admin)
 
         if user_representation:
-          
-            creation_date = convert_iat_to_date(user_representation['createdTimestamp'])
-
-            filtered_roles = get_user_roles(user_representation['id'])
-            
-            active_status = user_representation.get('enabled', False)
-            email_verified = user_representation.get('emailVerified', False)
+            user_info = _user_info(user_representation, get_user_roles(user_representation['id']))
 
-            user_info = {
-                "username": user_representation.get("username"),
-                "email": user_representation.get("email"),
-                "fullname": f"{user_representation.get('firstName', '')} {user_representation.get('lastName', '')}".strip(),
-                "joined_date": creation_date,
-                "id": user_representation.get("id"),
-                "roles": filtered_roles,
-                "active": active_status,
-                "email_verified": email_verified
-            }
+            # Keep the local user directory up to date with what Keycloak just returned
+            directory.upsert(user_info)
 
             return user_info
         return None
@@ -590,14 +1230,32 @@ def delete_user(user_id=None):
         keycloak_admin = initialize_admin_client()
 
         # Support both searching by UUID and by Username
-        if not is_valid_uuid(user_id):
-            id = keycloak_admin.get_user_id(user_id)
-            user_id = keycloak_admin.get_user(id)['id']
-            
-        keycloak_admin.delete_user(user_id)
+        username = None if is_valid_uuid(user_id) else user_id
+        if username is not None:
+            user_id = resolve_user_id(username, keycloak_admin)
+            if user_id is None:
+                raise AttributeError(f"User with ID '{username}' not found.")
+
+        try:
+            try:
+                keycloak_admin.delete_user(user_id)
+            except KeycloakDeleteError as e:
+                if e.response_code != 404 or username is None:
+                    raise
+                # The directory or the cache named a user that no longer exists, resolve the username again
+                forget_user_id(user_id)
+                user_id = resolve_user_id(username, keycloak_admin, refresh=True)
+                if user_id is None:
+                    raise AttributeError(f"User with ID '{username}' not found.") from e
+                keycloak_admin.delete_user(user_id)
+        finally:
+            # Whether the user was addressed by UUID or by username, and even if it is not in the directory
+            forget_user_id(user_id)
+
+        directory.remove(user_id)
         return user_id
 
-    except KeycloakGetError as e:
+    except (KeycloakGetError, KeycloakDeleteError) as e:
         if e.response_code == 404:
             raise AttributeError(f"User with ID '{user_id}' not found.") from e
         else:
@@ -722,6 +1380,10 @@ def patch_user_roles(user_id, role_ids):
     """
     Patch the roles of the user with new roles. Any roles not specified in the list will be removed.
 
+    The current state is read once (the user and its realm roles), the difference is computed
+    locally and applied with at most one delete and one assign call. The returned representation
+    is built from what was read and written, without fetching the user again.
+
     Args:
     - user_id: The UUID of the user or the username.
     - role_ids: A list of UUIDs or names of the realm roles to be assigned.
@@ -740,50 +1402,47 @@ def patch_user_roles(user_id, role_ids):
         # Initialize Keycloak admin client
         keycloak_admin = initialize_admin_client()
 
-        # Fetch the user representation
-        user_rep = get_user(user_id)
-        if not user_rep:
-            raise ValueError(f"User with ID: {user_id} was not found.")
-
-        # Fetch and validate roles
-        roles = []
+        # Validate the requested roles against the role catalog
+        requested_roles = {}
         for role in role_ids:
             rep = get_role(role)
             if rep is None:
                 raise ValueError(f"The following role was not found: {role}")
-            else:
-                roles.append(rep.get('name'))
+            requested_roles[rep['name']] = rep
 
-        current_roles = keycloak_admin.get_realm_roles_of_user(user_rep.get('id'))
-        current_role_names = get_user_roles(user_rep.get('id'))
+        with count_keycloak_calls() as counter:
+            # Read the current state once
+            user_representation = _fetch_user(user_id, keycloak_admin)
 
-        if roles is not None:
-            if not roles:
-                # No roles specified: Unassign all non-default roles
-                roles_to_remove = [role for role in current_roles if role['name'] != 'default-roles-master']
-                if roles_to_remove:
-                    keycloak_admin.delete_realm_roles_of_user(user_rep.get('id'), roles_to_remove)
-            else:
-                # Unassign roles not in the request
-                roles_to_remove = [role for role in current_roles if role['name'] not in roles and role['name'] != 'default-roles-master']
-                if roles_to_remove:
-                    keycloak_admin.delete_realm_roles_of_user(user_rep.get('id'), roles_to_remove)
-
-                # Assign new roles that are not already assigned
-                available_realm_roles = keycloak_admin.get_realm_roles()
-                roles_to_add = []
-                for role in roles:
-                    if role not in current_role_names:
-                        role_info = next((r for r in available_realm_roles if r['name'] == role), None)
-                        if role_info:
-                            roles_to_add.append(role_info)
-                        else:
-                            raise ValueError(f"Role '{role}' not found in realm roles")
-
-                if roles_to_add:
-                    keycloak_admin.assign_realm_roles(user_rep.get('id'), roles_to_add)
+            if not user_representation:
+                raise ValueError(f"User with ID: {user_id} was not found.")
 
-        return get_user(user_id)
+            current_roles = keycloak_admin.get_realm_roles_of_user(user_representation['id']) or []
+            current_role_names = {role['name'] for role in current_roles}
+
+            # Unassign roles not in the request, except the default one
+            roles_to_remove = [
+                role for role in current_roles
+                if role['name'] not in requested_roles and role['name'] != 'default-roles-master'
+            ]
+            # Assign the requested roles that are not already assigned
+            roles_to_add = [rep for name, rep in requested_roles.items() if name not in current_role_names]
+
+            if roles_to_remove:
+                keycloak_admin.delete_realm_roles_of_user(user_representation['id'], roles_to_remove)
+            if roles_to_add:
+                keycloak_admin.assign_realm_roles(user_representation['id'], roles_to_add)
+
+        logging.debug(f'Patched the roles of user {user_representation["id"]} with {counter.calls} Keycloak calls')
+
+        removed = {role['name'] for role in roles_to_remove}
+        roles = [role['name'] for role in current_roles if role['name'] not in removed and role['name'] != 'default-roles-master']
+        roles += [role['name'] for role in roles_to_add if role['name'] != 'default-roles-master']
+
+        user_info = _user_info(user_representation, roles)
+        directory.upsert(user_info)
+
+        return user_info
 
     except ValueError as ve:
         raise
@@ -846,6 +1505,7 @@ def create_realm_role(keycloak_admin, role_name):
         "containerId": config['REALM_NAME']
     }
     keycloak_admin.create_realm_role(realm_role,skip_exists=True)
+    invalidate_role_catalog()
 
     return role_name
 
@@ -855,6 +1515,7 @@ def delete_realm_roles(keycloak_admin,roles_to_delete):
         print("realm role to delete: ",role)
         role_id = keycloak_admin.get_realm_role(role)["id"]
         keycloak_admin.delete_role_by_id(role_id)
+    invalidate_role_catalog()
 
 def delete_client_roles(keycloak_admin,client_roles_to_delete):
     for client_role in client_roles_to_delete:
@@ -0,0 +1,133 @@
+from flask import Response, current_app
+from functools import wraps
+import functools
+import datetime
+import decimal
+import orjson
+
+"""
+    This .py file contains the fast JSON responses of the endpoints returning large, pre-shaped payloads.
+
+    An endpoint opts in with @lean_output, placed right under its @output decorator. Its dictionaries
+    (the success ones and the errors of token_active / database_exception_handler) are then encoded by
+    orjson into a Response. APIFlask passes a Response through untouched, so the envelope is not dumped
+    again by marshmallow, while @output still documents the endpoint in the OpenAPI spec.
+
+    The encoded JSON decodes to the same values as Flask's: sorted keys, compact, and datetimes as
+    HTTP dates (JSON_DATETIME_FORMAT='iso' switches to ISO 8601). It is not byte-identical: Flask
+    escapes non-ASCII characters (e.g. the Greek names of the operators) as \\uXXXX, orjson writes
+    them as UTF-8. A list of more than JSON_STREAM_MIN_ITEMS items is encoded and sent a chunk at
+    a time instead of as a single string.
+"""
+
+JSON_STREAM_CHUNK_SIZE = 1000
+
+# The fields of schema.ResponseAmbiguous, the only keys of the envelope its marshmallow dump keeps
+ENVELOPE_FIELDS = ('url', 'success', 'result', 'error')
+
+_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+# 'MM:SS GMT' of every second of an hour, indexed by minute * 60 + second
+_MINUTES_SECONDS = tuple(f"{minute:02d}:{second:02d} GMT" for minute in range(60) for second in range(60))
+
+@functools.lru_cache(maxsize=4096)
+def _date_hour(day: int, hour: int) -> str:
+    date = datetime.date.fromordinal(day)
+    return f"{_DAYS[date.weekday()]}, {date.day:02d} {_MONTHS[date.month - 1]} {date.year:04d} {hour:02d}:"
+
+def http_date(value: datetime.date) -> str:
+    """
+    Formats a date or datetime as an HTTP date, as werkzeug.http.http_date does (a naive datetime is taken as UTC).
+    The date and hour part is cached, as the rows of a page mostly share a few of them.
+    """
+    if not isinstance(value, datetime.datetime):
+        return _date_hour(value.toordinal(), 0) + _MINUTES_SECONDS[0]
+
+    offset = value.utcoffset()
+    if offset:
+        value = value - offset
+    return _date_hour(value.toordinal(), value.hour) + _MINUTES_SECONDS[value.minute * 60 + value.second]
+
+def _default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return http_date(value)
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def encoder(datetime_format: str = 'http'):
+    """
+    Returns the function encoding a value as JSON bytes, with datetimes as HTTP dates or ('iso') as ISO 8601.
+    """
+    option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+    if datetime_format != 'iso':
+        option |= orjson.OPT_PASSTHROUGH_DATETIME
+
+    return lambda value: orjson.dumps(value, default=_default, option=option)
+
+def _largest_list(value) -> int:
+    if isinstance(value, dict):
+        return max(map(_largest_list, value.values()), default=0)
+    if isinstance(value, list):
+        return len(value)
+    return 0
+
+def iter_json(value, encode, chunk_size: int = JSON_STREAM_CHUNK_SIZE):
+    """
+    Generates the JSON of a value in pieces: the lists longer than chunk_size (at any depth of dictionaries)
+    are encoded a chunk of items at a time, everything else at once.
+    """
+    if isinstance(value, dict) and _largest_list(value) > chunk_size:
+        yield b'{'
+        for index, key in enumerate(sorted(value)):
+            yield (b',' if index else b'') + encode(str(key)) + b':'
+            yield from iter_json(value[key], encode, chunk_size)
+        yield b'}'
+    elif isinstance(value, list) and len(value) > chunk_size:
+        yield b'['
+        for start in range(0, len(value), chunk_size):
+            # Strip the brackets of each chunk, the items are joined into the one array
+            yield (b',' if start else b'') + encode(value[start:start + chunk_size])[1:-1]
+        yield b']'
+    else:
+        yield encode(value)
+
+def json_response(payload: dict, status_code: int = 200) -> Response:
+    """
+    Returns the JSON response of a payload, streamed if it holds a list of more than JSON_STREAM_MIN_ITEMS items.
+    """
+    settings = current_app.config['settings']
+    # Read now: a streamed body is generated after the request handler has returned
+    encode = encoder(settings['JSON_DATETIME_FORMAT'])
+    min_items = settings['JSON_STREAM_MIN_ITEMS']
+
+    if min_items <= 0 or _largest_list(payload) <= min_items:
+        return Response(encode(payload) + b'\n', status=status_code, mimetype='application/json')
+
+    def generate():
+        yield from iter_json(payload, encode, min(min_items, JSON_STREAM_CHUNK_SIZE))
+        yield b'\n'
+
+    return Response(generate(), status=status_code, mimetype='application/json')
+
+def lean_output(f):
+    """
+    Encodes the dictionaries returned by an endpoint with json_response(), skipping the marshmallow dump of @output.
+
+    Args:
+        f: The endpoint, returning a dictionary or a (dictionary, status code) tuple. As with @output,
+           only the fields of the response envelope (ENVELOPE_FIELDS) are kept.
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        rv = f(*args, **kwargs)
+        if isinstance(rv, dict):
+            rv = (rv, 200)
+        if not (isinstance(rv, tuple) and len(rv) == 2 and isinstance(rv[0], dict) and isinstance(rv[1], int)):
+            return rv
+
+        payload, status_code = rv
+        return json_response({key: payload[key] for key in ENVELOPE_FIELDS if key in payload}, status_code)
+
+    return wrapper
@@ -1,13 +1,21 @@
 from flask import request
+from flask import Response
 from apiflask import APIBlueprint
 from auth import security_doc, token_active
+from responses import lean_output
 from sqlalchemy.orm import Session
 import logging 
 import schema
+import csv
+import io
+import json
+from marshmallow import ValidationError
 from db.crud import computers_db
 from db.db_schemas import ComputerSchema, EntrySchema
 from db.crud import entries_db
 from db.database import database_exception_handler
+from db.pagination import next_cursor
+from db.export import stream_export, export_unavailable, MIMETYPES
 
 """
     This .py file contains the endpoints attached to the blueprint
@@ -61,11 +69,13 @@ def get_searched_computers_count(db: Session, query_data: dict):
         Args optionally:
             - limit: Maximum number of computers returned per request, if limit is 0 all computers are returned.
             - offset: Offset of the result by #offset computer.
+            - mode: 'substring' (default) or 'fulltext'.
     """
 
     data_to_search = query_data.get("search")
+    mode = query_data.get("mode", "substring")
     
-    count = computers_db.count_searched(db=db, data=data_to_search)
+    count = computers_db.count_searched(db=db, data=data_to_search, mode=mode)
     
     return {
         'url': request.url,
@@ -103,6 +113,7 @@ def get_computer_classes(db: Session):
 @computers_bp.doc(tags=['Computer Management'], security=security_doc)
 @computers_bp.input(schema.PaginationParameters, location='query')
 @computers_bp.output(schema.ResponseAmbiguous, status_code=200)
+@lean_output
 @token_active
 @database_exception_handler
 def get_computer_by_label(db: Session, uuid_label: str, query_data: dict):
@@ -118,7 +129,12 @@ def get_computer_by_label(db: Session, uuid_label: str, query_data: dict):
     if offset < 0 or limit < 0:
         raise ValueError(f'Pagination paramteres offset and limit must be non negative...')
 
-    entries = entries_db.read_all_entries_by_label(db=db, uuid_label=computer.get("uuid_label"), offset=offset, limit=limit)
+    after = query_data.get('after')
+    with_total = query_data.get('with_total', False)
+
+    entries = entries_db.read_all_entries_by_label(db=db, uuid_label=computer.get("uuid_label"), offset=offset, limit=limit, after=after, with_total=with_total)
+    if with_total:
+        entries, total = entries
 
 
     return {
@@ -127,7 +143,9 @@ def get_computer_by_label(db: Session, uuid_label: str, query_data: dict):
             'computer': computer,
             'entries': {
                 'count': len(entries),
-                'history': entries
+                'history': entries,
+                'next_cursor': next_cursor('entries', entries, ['created_at', 'uuid'], limit),
+                **({'total': total} if with_total else {})
             }
         },
         'success': True
@@ -137,6 +155,7 @@ def get_computer_by_label(db: Session, uuid_label: str, query_data: dict):
 @computers_bp.doc(tags=['Computer Management'], security=security_doc)
 @computers_bp.input(schema.PaginationParameters, location='query')
 @computers_bp.output(schema.ResponseAmbiguous, status_code=200)
+@lean_output
 @token_active
 @database_exception_handler
 def get_computers(db: Session, query_data: dict):
@@ -147,21 +166,29 @@ def get_computers(db: Session, query_data: dict):
         Args optionally:
             - limit: Maximum number of computers returned per request, if limit is 0 all computers are returned.
             - offset: Offset of the result by #offset computer.
+            - after: The next_cursor of the previous page, to continue right after it (the offset is then ignored).
+            - with_total: Also return the total number of computers, read from the summary counters (counted in the same query after a cursor).
     """
     
     offset = query_data.get('offset', 0)
     limit = query_data.get('limit', 0)
+    after = query_data.get('after')
+    with_total = query_data.get('with_total', False)
 
     if limit < 0 or offset < 0:
         raise ValueError('Pagination parameters limit and offset must be non negative...')
     
-    computers = computers_db.read_all_computers(db=db, offset=offset, limit=limit)
+    computers = computers_db.read_all_computers(db=db, offset=offset, limit=limit, after=after, with_total=with_total)
+    if with_total:
+        computers, total = computers
     
     return {
         'url': request.url,
         'result':  { 
             'computers': computers,
-            'count': len(computers)
+            'count': len(computers),
+            'next_cursor': next_cursor('computers', computers, ['uuid_label'], limit),
+            **({'total': total} if with_total else {})
         },
         'success': True
     }, 200
@@ -204,10 +231,126 @@ def create_computer(db: Session, json_data: dict):
         }
     }, 200
 
+# Maximum number of computers in a single import
+MAX_IMPORT_ROWS = 5000
+
+def read_import_rows(body: str, format: str, created_by: str = None) -> tuple[list, dict]:
+    """
+    Parses and validates the rows of a computer import.
+
+    Args:
+        body (str): The CSV (with a header line) or NDJSON (one JSON object per line) document.
+        format (str): 'csv' or 'ndjson'.
+        created_by (str): The operator of the rows without a created_by.
+
+    Returns:
+        tuple: The valid rows as (row number, data) pairs, and the errors of the invalid rows by row number.
+            Rows are numbered from 1, in the order of the document (the CSV header is not a row).
+
+    Raises:
+        ValueError: If the document holds no rows or more than MAX_IMPORT_ROWS.
+    """
+    if format == 'csv':
+        records = [{key: value for key, value in record.items() if key and value not in (None, '')} for record in csv.DictReader(io.StringIO(body))]
+    else:
+        records = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                records.append(record if isinstance(record, dict) else ValidationError("Expected a JSON object."))
+            except json.JSONDecodeError as e:
+                records.append(ValidationError(f"Invalid JSON: {e.msg}."))
+
+    if not records:
+        raise ValueError("The import holds no computers...")
+    if len(records) > MAX_IMPORT_ROWS:
+        raise ValueError(f"An import holds at most {MAX_IMPORT_ROWS} computers, got {len(records)}...")
+
+    rows, errors = [], {}
+    registration = schema.NewComputerRegistration()
+    for row_number, record in enumerate(records, start=1):
+        try:
+            if isinstance(record, ValidationError):
+                raise record
+            if created_by and 'created_by' not in record:
+                record['created_by'] = created_by
+            rows.append((row_number, registration.load(record)))
+        except ValidationError as e:
+            errors[row_number] = e.messages if isinstance(e.messages, dict) else {'row': e.messages}
+
+    return rows, errors
+
+@computers_bp.route('/import', methods=['POST'])
+@computers_bp.doc(tags=['Computer Management'], security=security_doc)
+@computers_bp.input(schema.ComputerImportParameters, location='query')
+@computers_bp.output(schema.ResponseAmbiguous, status_code=200)
+@token_active
+@database_exception_handler
+def import_computers(db: Session, query_data: dict):
+    """
+        Registers many computers at once from a CSV (text/csv, with a header line) or NDJSON (application/x-ndjson)
+        body. Every row is validated like a single registration. The valid rows without conflicts are registered
+        with their "Registration" entries in one transaction, the others are reported. Requires active token.
+
+        Args optionally:
+            - format: 'csv' or 'ndjson', by default from the Content-Type of the request.
+            - created_by: The operator of the rows without a created_by column.
+
+        Returns:
+            - dict():  The JSON with the number of imported and failed rows and the result of every row
+    """
+
+    format = query_data.get('format')
+    if format is None:
+        format = {'text/csv': 'csv', 'application/x-ndjson': 'ndjson', 'application/ndjson': 'ndjson', 'application/jsonl': 'ndjson'}.get(request.mimetype)
+    if format is None:
+        raise ValueError(f"Unsupported import format {request.mimetype}, send text/csv or application/x-ndjson...")
+
+    rows, errors = read_import_rows(request.get_data(as_text=True), format, query_data.get('created_by'))
+
+    results = computers_db.import_computers(db=db, rows=rows)
+    results.update({row_number: {'errors': row_errors} for row_number, row_errors in errors.items()})
+
+    return {
+        "url": request.url,
+        "success": True,
+        "result": {
+            "imported": sum(1 for result in results.values() if 'errors' not in result),
+            "failed": sum(1 for result in results.values() if 'errors' in result),
+            "rows": [{'row': row_number, 'success': 'errors' not in result, **result} for row_number, result in sorted(results.items())]
+        }
+    }, 200
+
+@computers_bp.route('/export', methods=['GET'])
+@computers_bp.doc(tags=['Computer Management'], security=security_doc)
+@computers_bp.input(schema.ExportParameters, location='query')
+@token_active
+def export_computers(query_data: dict):
+    """
+        Streams all the computers as CSV, NDJSON, Arrow or Parquet, read through a server-side cursor. Requires active token.
+
+        Args optionally:
+            - format: 'csv' (with a header line), 'ndjson' (the default), 'arrow' (Arrow IPC file) or 'parquet'.
+    """
+
+    format = query_data['format']
+
+    try:
+        stream = stream_export('computers', format)
+    except ImportError as e:
+        return export_unavailable(e)
+
+    return Response(stream, mimetype=MIMETYPES[format], headers={
+        'Content-Disposition': f'attachment; filename=computers.{format}'
+    })
+
 @computers_bp.route('/<host_name>', methods=['GET'], strict_slashes=False)
 @computers_bp.doc(tags=['Computer Management'], security=security_doc)
 @computers_bp.input(schema.PaginationParameters, location='query')
 @computers_bp.output(schema.ResponseAmbiguous, status_code=200)
+@lean_output
 @token_active
 @database_exception_handler
 def get_computer_by_hostname(db: Session, host_name: str, query_data: dict):
@@ -229,7 +372,12 @@ def get_computer_by_hostname(db: Session, host_name: str, query_data: dict):
     if offset < 0 or limit < 0:
         raise ValueError(f'Pagination paramteres offset and limit must be non negative...')
 
-    entries = entries_db.read_all_entries_by_label(db=db, uuid_label=computer.get("uuid_label"), offset=offset, limit=limit)
+    after = query_data.get('after')
+    with_total = query_data.get('with_total', False)
+
+    entries = entries_db.read_all_entries_by_label(db=db, uuid_label=computer.get("uuid_label"), offset=offset, limit=limit, after=after, with_total=with_total)
+    if with_total:
+        entries, total = entries
 
     return {
         'url': request.url,
@@ -237,7 +385,9 @@ def get_computer_by_hostname(db: Session, host_name: str, query_data: dict):
             'computer': computer,
             'entries': {
                 'count': len(entries),
-                'history': entries
+                'history': entries,
+                'next_cursor': next_cursor('entries', entries, ['created_at', 'uuid'], limit),
+                **({'total': total} if with_total else {})
             }
         },
         'success': True
@@ -247,21 +397,38 @@ def get_computer_by_hostname(db: Session, host_name: str, query_data: dict):
 @computers_bp.doc(tags=['Computer Management'], security=security_doc)
 @computers_bp.input(schema.GenericSearch, location='query')
 @computers_bp.output(schema.ResponseAmbiguous, status_code=200)
+@lean_output
 @token_active
 @database_exception_handler
 def generic_search(db: Session, query_data: dict):
+    """
+        Searches the computers. Requires active token.
+
+        Args optionally:
+            - limit: Maximum number of computers returned per request, if limit is 0 all computers are returned.
+            - offset: Offset of the result by #offset computer.
+            - mode: 'substring' (default) finds the computers whose host name, label, security seal, IP or MAC address
+              contain the searched text. 'fulltext' searches the words (or word prefixes) of the text in all the
+              descriptive columns, e.g. the user, office and serial numbers, and returns the best matches first.
+            - with_total: Also return the total number of matches, counted in the same query (no need for /generic/count).
+    """
 
     data_to_search = query_data.get("search")
     limit = query_data.get("limit", 0)
     offset = query_data.get("offset", 0)
+    mode = query_data.get("mode", "substring")
+    with_total = query_data.get("with_total", False)
 
-    computers = computers_db.generic_search(db=db, data=data_to_search, limit=int(limit), offset=int(offset))
+    computers = computers_db.generic_search(db=db, data=data_to_search, limit=int(limit), offset=int(offset), mode=mode, with_total=with_total)
+    if with_total:
+        computers, total = computers
 
     return {
         'url': request.url,
         'result':  { 
             'computers': computers,
-            'count': len(computers)
+            'count': len(computers),
+            **({'total': total} if with_total else {})
         },
         'success': True
     }, 200 
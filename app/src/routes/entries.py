@@ -1,12 +1,17 @@
 from flask import request
+from flask import Response
 from apiflask import APIBlueprint
 from auth import security_doc, token_active, gpolicy_required
+from responses import lean_output
 from sqlalchemy.orm import Session
 import logging 
 import schema
 from db.db_schemas import EntrySchema
 from db.crud import entries_db
 from db.database import database_exception_handler
+from db.pagination import next_cursor
+from db.export import stream_export, export_unavailable, MIMETYPES
+from db.models import Entry
 
 """
     This .py file contains the endpoints attached to the blueprint
@@ -25,6 +30,7 @@ entries_bp = APIBlueprint('entries_blueprint', __name__, tag={'name':'Entry (His
 @entries_bp.doc(tags=['Entry (History) Management'], security=security_doc)
 @entries_bp.input(schema.PaginationParameters, location='query')
 @entries_bp.output(schema.ResponseAmbiguous, status_code=200)
+@lean_output
 @token_active
 @database_exception_handler
 def read_entries(db: Session, query_data: dict):
@@ -37,25 +43,83 @@ def read_entries(db: Session, query_data: dict):
     
     offset = query_data.get('offset', 0)
     limit = query_data.get('limit', 0)
+    after = query_data.get('after')
+    with_total = query_data.get('with_total', False)
 
     if limit < 0 or offset < 0:
         raise ValueError('Pagination parameters limit and offset must be non negative...')
     
-    entries = entries_db.read_all_entries(db=db, offset=offset, limit=limit)
+    entries = entries_db.read_all_entries(db=db, offset=offset, limit=limit, after=after, with_total=with_total)
+    if with_total:
+        entries, total = entries
     
     return {
         'url': request.url,
         'result':  { 
             'entries': entries,
-            'count': len(entries)
+            'count': len(entries),
+            'next_cursor': next_cursor('entries', entries, ['created_at', 'uuid'], limit),
+            **({'total': total} if with_total else {})
         },
         'success': True
     }, 200
 
+@entries_bp.route('/export', methods=['GET'])
+@entries_bp.doc(tags=['Entry (History) Management'], security=security_doc)
+@entries_bp.input(schema.EntryExportParameters, location='query')
+@token_active
+def export_entries(query_data: dict):
+    """
+        Streams the entries (history) as CSV, NDJSON, Arrow or Parquet, read through a server-side cursor. Requires active token.
+
+        Args optionally:
+            - format: 'csv' (with a header line), 'ndjson' (the default), 'arrow' (Arrow IPC file) or 'parquet'.
+            - uuid_label: Only the entries of this computer.
+    """
+
+    format = query_data['format']
+    uuid_label = query_data.get('uuid_label')
+    where = [Entry.uuid_label == uuid_label] if uuid_label is not None else []
+
+    try:
+        stream = stream_export('entries', format, where)
+    except ImportError as e:
+        return export_unavailable(e)
+
+    return Response(stream, mimetype=MIMETYPES[format], headers={
+        'Content-Disposition': f'attachment; filename=entries.{format}'
+    })
+
+@entries_bp.route('/jobs/export', methods=['GET'])
+@entries_bp.doc(tags=['Entry (History) Management'], security=security_doc)
+@entries_bp.input(schema.JobExportParameters, location='query')
+@token_active
+def export_jobs(query_data: dict):
+    """
+        Streams the jobs (entries with the host name of their computer) as CSV, NDJSON, Arrow or Parquet. Requires active token.
+
+        Args optionally:
+            - format: 'csv' (with a header line), 'ndjson' (the default), 'arrow' (Arrow IPC file) or 'parquet'.
+            - filter: 'all' (the default) or 'recent' (open, or closed within the last 24 hours).
+    """
+
+    format = query_data['format']
+    where = [entries_db.recent_jobs_condition()] if query_data['filter'] == 'recent' else []
+
+    try:
+        stream = stream_export('jobs', format, where)
+    except ImportError as e:
+        return export_unavailable(e)
+
+    return Response(stream, mimetype=MIMETYPES[format], headers={
+        'Content-Disposition': f'attachment; filename=jobs.{format}'
+    })
+
 @entries_bp.route('/jobs', methods=['GET'])
 @entries_bp.doc(tags=['Entry (History) Management'], security=security_doc)
 @entries_bp.input(schema.JobQueryPatameters, location='query')
 @entries_bp.output(schema.ResponseAmbiguous, status_code=200)
+@lean_output
 @token_active
 @database_exception_handler
 def read_jobs(db: Session, query_data: dict):
@@ -70,14 +134,20 @@ def read_jobs(db: Session, query_data: dict):
     offset = query_data.get('offset', 0)
     filter = query_data.get('filter')
     sort = query_data.get('sort')
+    after = query_data.get('after')
+    with_total = query_data.get('with_total', False)
     
-    jobs = entries_db.get_jobs(db=db, limit=limit, offset=offset, filter=filter, sort=sort)
+    jobs = entries_db.get_jobs(db=db, limit=limit, offset=offset, filter=filter, sort=sort, after=after, with_total=with_total)
+    if with_total:
+        jobs, total = jobs
         
     return {
         'url': request.url,
         'result':  { 
             'jobs': jobs,
-            'count': len(jobs)
+            'count': len(jobs),
+            'next_cursor': next_cursor(f'jobs:{sort}', jobs, [sort, 'uuid'], limit),
+            **({'total': total} if with_total else {})
         },
         'success': True
     }, 200
@@ -173,12 +243,22 @@ def update_entry(db: Session, entry_id: str, json_data: dict):
 
 @entries_bp.route('/traffic', methods=['GET'])
 @entries_bp.doc(tags=['Entry (History) Management'], security=security_doc)
+@entries_bp.input(schema.TrafficParameters, location='query')
 @entries_bp.output(schema.ResponseAmbiguous, status_code=200)
+@lean_output
 @token_active
 @database_exception_handler
-def get_traffic(db: Session):
+def get_traffic(db: Session, query_data: dict):
+    """
+        Returns the number of entries per day and network. Requires active token.
+
+        Args optionally:
+            - start: The first day (YYYY-MM-DD), by default 40 days ago.
+            - end: The last day (YYYY-MM-DD), by default today.
+            - networks: The networks to return (repeatable), by default all of them.
+    """
 
-    result = entries_db.get_traffic(db=db)
+    result = entries_db.get_traffic(db=db, start=query_data.get('start'), end=query_data.get('end'), networks=query_data.get('networks'))
 
     return {
         'url': request.url,
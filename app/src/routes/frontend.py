@@ -1,4 +1,4 @@
-from flask import request, jsonify, current_app, url_for, render_template, url_for, redirect, session, flash
+from flask import request, jsonify, current_app, url_for, render_template, url_for, redirect, session, flash, g
 from apiflask import APIBlueprint
 import requests
 from auth import auth, security_doc, admin_required, token_active
@@ -43,6 +43,7 @@ def session_required(f):
             except Exception as e:
                 pass
 
+            kutils.forget_token(access_token)
             session.clear()
             # Clear local session and redirect to the login page
             flash("Session Expired, Please Login Again","warning") 
@@ -65,6 +66,13 @@ logging.basicConfig(level=logging.DEBUG)
 
 frontend_bp = APIBlueprint('frontend_blueprint', __name__, enable_openapi=False)
 
+@frontend_bp.context_processor
+def inject_user_metadata():
+    # Pages read the role, username and fullname of the principal resolved by session_required
+    if g.get('principal') is None:
+        return {}
+    return kutils.load_user_metadata()
+
 @frontend_bp.route("/login", methods=['GET', 'POST'])
 def login_page():
     if request.method == 'GET':
@@ -97,6 +105,7 @@ def logout():
     except Exception as e:
         pass
 
+    kutils.forget_token(session.get('access_token'))
     session.clear()
     return redirect(url_for('frontend_blueprint.login_page'))
 
@@ -104,7 +113,6 @@ def logout():
 @session_required
 @database_exception_handler
 def home_page(db: Session):
-    user_data = kutils.load_user_metadata()
     uptime_seconds = int(time.time() - START_TIME)
     days = uptime_seconds // 86400
     hours = (uptime_seconds % 86400) // 3600
@@ -115,21 +123,20 @@ def home_page(db: Session):
     open_tickets_count = count_open(db=db)
     open_jobs_count = count_all_jobs(db=db, filter='recent')
 
-    return render_template("home.html", open_tickets_count=open_tickets_count, open_jobs_count=open_jobs_count,
-                            role=user_data.get("role", "Undefined"), username=user_data.get("username", "undefined"), 
-                            fullname=user_data.get("fullname", "Undefined"), uptime=uptime_str)
+    # Give the connection back to the pool before rendering
+    db.close()
+
+    return render_template("home.html", open_tickets_count=open_tickets_count, open_jobs_count=open_jobs_count, uptime=uptime_str)
 
 @frontend_bp.route("/computers", methods=['GET'])
 @session_required
 def computers_page():
-    user_data = kutils.load_user_metadata()
-    return render_template("computers.html", role=user_data.get("role", "Undefined"), username=user_data.get("username", "undefined"), fullname=user_data.get("fullname", "Undefined"))
+    return render_template("computers.html")
 
 @frontend_bp.route("/computers/new", methods=['GET'])
 @session_required
 @database_exception_handler
 def new_computer_page(db: Session):
-    user_data = kutils.load_user_metadata()
     operators_list = read_all_operators(db=db)
 
     operators = []
@@ -139,71 +146,76 @@ def new_computer_page(db: Session):
     next_label = generate_next_uuid_label(db=db)
     next_hostname = generate_next_hostname(db=db)
 
-    return render_template("new-computer.html", next_label=next_label, next_hostname=next_hostname, operators=operators, role=user_data.get("role", "Undefined"), username=user_data.get("username", "undefined"), fullname=user_data.get("fullname", "Undefined"))
+    # Give the connection back to the pool before rendering
+    db.close()
+
+    return render_template("new-computer.html", next_label=next_label, next_hostname=next_hostname, operators=operators)
 
 @frontend_bp.route("/computers/edit/<uuid_label>", methods=['GET'])
 @session_required
 @database_exception_handler
 def edit_computer_page(db: Session, uuid_label: str):
-    user_data = kutils.load_user_metadata()
     operators_list = read_all_operators(db=db)
 
     operators = []
     for element in operators_list:
         operators.append({'id': element['id'], 'name': str(element['rank'] + " " + element['lname'] + " " + element['fname'])})
 
-    return render_template("edit-computer.html", operators=operators, role=user_data.get("role", "Undefined"), username=user_data.get("username", "undefined"), fullname=user_data.get("fullname", "Undefined"))
+    # Give the connection back to the pool before rendering
+    db.close()
+
+    return render_template("edit-computer.html", operators=operators)
 
 
 @frontend_bp.route("/computers/<label>", methods=['GET'])
 @session_required
 def specific_computer_page(label: str):
-    user_data = kutils.load_user_metadata()
-    return render_template("datagrid.html", uuid_label=label, role=user_data.get("role", "Undefined"), username=user_data.get("username", "undefined"), fullname=user_data.get("fullname", "Undefined"))
+    return render_template("datagrid.html", uuid_label=label)
 
 @frontend_bp.route("/jobs", methods=['GET'])
 @session_required
 def jobs_page():
-    user_data = kutils.load_user_metadata()
-    return render_template("jobs.html", role=user_data.get("role", "Undefined"), username=user_data.get("username", "undefined"), fullname=user_data.get("fullname", "Undefined"))
+    return render_template("jobs.html")
 
 @frontend_bp.route("/tickets", methods=['GET'])
 @session_required
 def tickets_page():
-    user_data = kutils.load_user_metadata()
-    return render_template("tickets.html", role=user_data.get("role", "Undefined"), username=user_data.get("username", "undefined"), fullname=user_data.get("fullname", "Undefined"))
+    return render_template("tickets.html")
 
 @frontend_bp.route("/tickets/new", methods=['GET'])
 @session_required
 @database_exception_handler
 def new_ticket_page(db: Session):
-    user_data = kutils.load_user_metadata()
     operators_list = read_all_operators(db=db)
 
     operators = []
     for element in operators_list:
         operators.append({'id': element['id'], 'name': str(element['rank'] + " " + element['lname'] + " " + element['fname'])})
 
-    return render_template("new-ticket.html", operators=operators, role=user_data.get("role", "Undefined"), username=user_data.get("username", "undefined"), fullname=user_data.get("fullname", "Undefined"))
+    # Give the connection back to the pool before rendering
+    db.close()
+
+    return render_template("new-ticket.html", operators=operators)
 
 @frontend_bp.route("/tickets/<ticket_id>", methods=['GET'])
 @session_required
 @database_exception_handler
 def ticket_page(db: Session, ticket_id: str):
-    user_data = kutils.load_user_metadata()
     operators_list = read_all_operators(db=db)
 
     operators = []
     for element in operators_list:
         operators.append({'id': element['id'], 'name': str(element['rank'] + " " + element['lname'] + " " + element['fname'])})
 
-    return render_template("specific-ticket.html", operators=operators, role=user_data.get("role", "Undefined"), username=user_data.get("username", "undefined"), fullname=user_data.get("fullname", "Undefined"))
+    # Give the connection back to the pool before rendering
+    db.close()
+
+    return render_template("specific-ticket.html", operators=operators)
 
 @frontend_bp.route("/operators", methods=['GET'])
 @session_required
 def operators_page():
-    user_data = kutils.load_user_metadata()
-    return render_template("operators.html", role=user_data.get("role", "Undefined"), username=user_data.get("username", "undefined"), fullname=user_data.get("fullname", "Undefined"))
+    return render_template("operators.html")
 
 @frontend_bp.route("/403", methods=['GET'])
 def auth_error():
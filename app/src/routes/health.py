@@ -3,6 +3,7 @@ from flask import request
 import logging 
 import schema
 import time
+from db.database import pool_stats, replica_stats
 
 import os
 
@@ -29,7 +30,7 @@ import psycopg2
 
 @health_bp.route('/', methods=['GET'])
 @health_bp.doc(tags=['Health'])
-@health_bp.output(schema.ResponseAmbiguous, status_code=200, example={"result":{"keycloak":{"active":True,"time":8.2},"pgadmin":{"active":True,"time":25.9},"postgres":{"active":True,"time":23.7}},"success":True,"url":"http://pgadmin:80/login?next=/"})
+@health_bp.output(schema.ResponseAmbiguous, status_code=200, example={"result":{"keycloak":{"active":True,"time":8.2},"pgadmin":{"active":True,"time":25.9},"postgres":{"active":True,"time":23.7,"pool":{"avg_wait_ms":0.021,"checked_in":2,"checked_out":1,"checkouts":1520,"max_wait_ms":4.8,"overflow":0,"size":5,"timeouts":0}}},"success":True,"url":"http://pgadmin:80/login?next=/"})
 def health():
     results = {}
     
@@ -78,7 +79,9 @@ def health():
             },
             "postgres": {
                 "active": results['postgres'],
-                "time": round((postgres_response_time_end - postgres_response_time_start) / 1000000, 1)
+                "time": round((postgres_response_time_end - postgres_response_time_start) / 1000000, 1),
+                "pool": pool_stats(),
+                "replicas": replica_stats()
             }
         }
     }, 200
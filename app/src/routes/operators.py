@@ -1,6 +1,7 @@
 from flask import request
 from apiflask import APIBlueprint
 from auth import security_doc, token_active
+from responses import lean_output
 from sqlalchemy.orm import Session
 import logging 
 import schema
@@ -24,6 +25,7 @@ operators_bp = APIBlueprint('operators_blueprint', __name__, tag={'name':'Helpde
 @operators_bp.route('/', methods=['GET'])
 @operators_bp.doc(tags=['Helpdesk Operators Management'], security=security_doc)
 @operators_bp.output(schema.ResponseAmbiguous, status_code=200, example={"result":{"count":3,"operators":[{"fname":"ΑΝΔΡΕΑΣ","id":13,"lname":"ΣΤΡΑΤΑΚΗΣ","rank":"ΣΤΡ"},{"fname":"ΑΛΛΟΣ","id":14,"lname":"ΚΑΠΟΙΟΣ","rank":"ΣΤΡ"},{"fname":"BILL","id":15,"lname":"SMITH","rank":"CEO"}]},"success":True,"url":"http://192.168.1.86:3000/api/v1/operators/"})
+@lean_output
 @token_active
 @database_exception_handler
 def get_operators(db: Session):
@@ -1,12 +1,17 @@
 from flask import request
+from flask import Response
 from apiflask import APIBlueprint
 from auth import security_doc, token_active
+from responses import lean_output
 from sqlalchemy.orm import Session
 import logging 
 import schema
 from db.crud import tickets_db
 from db.db_schemas import TicketSchema
 from db.database import database_exception_handler
+from db.pagination import next_cursor
+from db.export import stream_export, export_unavailable, MIMETYPES
+from db.models import Ticket
 
 """
     This .py file contains the endpoints attached to the blueprint
@@ -24,11 +29,16 @@ tickets_bp = APIBlueprint('tickets_blueprint', __name__, tag={'name':'Ticket Man
 @tickets_bp.doc(tags=['Ticket Management'], security=security_doc)
 @tickets_bp.input(schema.TicketSearchParameters, location='query')
 @tickets_bp.output(schema.ResponseAmbiguous, status_code=200)
+@lean_output
 @token_active
 @database_exception_handler
 def get_tickets(db: Session, query_data: dict):
     """
-        Reads all tickets. Requires active token.
+        Reads all tickets. Requires active token. Supports pagination.
+
+        Args optionally:
+            - status: Only the tickets with these statuses (repeatable).
+            - with_total: Also return the total number of matching tickets, read from the summary counters.
 
         Returns:
             - dict():  The JSON containing the status
@@ -37,18 +47,50 @@ def get_tickets(db: Session, query_data: dict):
     limit = query_data.get("limit", 0)
     offset = query_data.get("offset", 0)
     status = query_data.get("status", [])
+    after = query_data.get("after")
+    with_total = query_data.get("with_total", False)
     
-    tickets = tickets_db.read_all_tickets(db=db, offset=int(offset), limit=int(limit), status=status)
+    tickets = tickets_db.read_all_tickets(db=db, offset=int(offset), limit=int(limit), status=status, after=after, with_total=with_total)
+    if with_total:
+        tickets, total = tickets
 
     return {
         'url': request.url,
         'result': {
             "count": len(tickets),
-            "tickets": tickets
+            "tickets": tickets,
+            "next_cursor": next_cursor('tickets', tickets, ['created_at', 'id'], int(limit)),
+            **({'total': total} if with_total else {})
         },
         'success': True
     }, 200
 
+@tickets_bp.route('/export', methods=['GET'])
+@tickets_bp.doc(tags=['Ticket Management'], security=security_doc)
+@tickets_bp.input(schema.TicketExportParameters, location='query')
+@token_active
+def export_tickets(query_data: dict):
+    """
+        Streams the tickets as CSV, NDJSON, Arrow or Parquet, read through a server-side cursor. Requires active token.
+
+        Args optionally:
+            - format: 'csv' (with a header line), 'ndjson' (the default), 'arrow' (Arrow IPC file) or 'parquet'.
+            - status: Only the tickets with these statuses (repeatable).
+    """
+
+    format = query_data['format']
+    status = query_data.get('status', [])
+    where = [Ticket.status.in_(status)] if status else []
+
+    try:
+        stream = stream_export('tickets', format, where)
+    except ImportError as e:
+        return export_unavailable(e)
+
+    return Response(stream, mimetype=MIMETYPES[format], headers={
+        'Content-Disposition': f'attachment; filename=tickets.{format}'
+    })
+
 @tickets_bp.route('/<ticket_id>', methods=['GET'])
 @tickets_bp.doc(tags=['Ticket Management'], security=security_doc)
 @tickets_bp.output(schema.ResponseAmbiguous, status_code=200)
@@ -1,7 +1,8 @@
 from flask import request, jsonify, current_app, url_for
 from apiflask import APIBlueprint
 import requests
-from auth import auth, security_doc, admin_required, token_active
+from auth import auth, security_doc, admin_required, token_active, introspection_required
+from responses import lean_output
 import logging 
 import schema
 import xml.etree.ElementTree as ET
@@ -22,28 +23,31 @@ users_bp = APIBlueprint('users_blueprint', __name__, tag={'name':'User Managemen
 
 @users_bp.route('/', methods=['GET'])
 @users_bp.doc(tags=['User Management'], security=security_doc)
-@users_bp.input(schema.PaginationParameters, location='query')
-@users_bp.output(schema.ResponseAmbiguous, status_code=200, example={"result":{"count":2,"users":[{"active":True,"fullname":"GP Default","id":"b16d521b-d81c-435d-bc81-11f2491d4280","joined_date":"13-02-2025","roles":[],"username":"gp.default"},{"active":True,"fullname":"Help Desk","id":"337da7e8-7ec4-4bb3-96fa-ca116eeea127","joined_date":"13-02-2025","roles":[],"username":"helpdesk"}]},"success":True,"url":"http://192.168.1.86:3000/api/v1/users/?limit=2&offset=1"})
+@users_bp.input(schema.UserSearchParameters, location='query')
+@users_bp.output(schema.ResponseAmbiguous, status_code=200, example={"result":{"count":2,"total":14,"users":[{"active":True,"fullname":"GP Default","id":"b16d521b-d81c-435d-bc81-11f2491d4280","joined_date":"13-02-2025","roles":[],"username":"gp.default"},{"active":True,"fullname":"Help Desk","id":"337da7e8-7ec4-4bb3-96fa-ca116eeea127","joined_date":"13-02-2025","roles":[],"username":"helpdesk"}]},"success":True,"url":"http://192.168.1.86:3000/api/v1/users/?limit=2&offset=1"})
+@lean_output
 @token_active
 @admin_required
 def get_users(query_data: dict):
     """
-        Returns a JSON of all users. Requires admin role. Supports pagination.
+        Returns a JSON of all users. Requires admin role. Supports pagination and search by username or name.
 
         Returns:
-            - dict():  The JSON containing the users
+            - dict():  The JSON containing the users, their count and the total number of matching users
     """
     try:
         offset = query_data.get('offset', 0)
         limit = query_data.get('limit', 0)
+        search = query_data.get('search')
         
-        users = kutils.get_users_from_keycloak(offset=offset, limit=limit)
+        users, total = kutils.search_users(search=search, offset=offset, limit=limit)
                 
         return {
             'url': request.url,
             'result':  { 
                 'users': users,
-                'count': len(users)
+                'count': len(users),
+                'total': total
             },
             'success': True
         }, 200    
@@ -143,6 +147,7 @@ def api_token_refresh(json_data: dict):
 @users_bp.doc(tags=['User Management'], security=security_doc)
 @token_active
 @admin_required
+@introspection_required
 def api_create_user(json_data: dict):
     """
     Creates a new user. Requires admin role.
@@ -214,6 +219,58 @@ def api_create_user(json_data: dict):
             "success": False
         }, 500
 
+@users_bp.route('/bulk', methods=['POST'])
+@users_bp.input(schema.NewUsers, location='json', example={"users":[{"username":"j.doe","firstName":"John","lastName":"Doe","password":"mypassword","enabled":True,"roles":["Helpdesk"]}]})
+@users_bp.output(schema.ResponseAmbiguous, status_code=200, example={"help":"http://192.168.1.86:3000/api/v1/users/bulk","result":{"created":1,"failed":1,"users":[{"success":True,"user":{"active":True,"email":None,"email_verified":False,"fullname":"John Doe","id":"b16d521b-d81c-435d-bc81-11f2491d4280","joined_date":"13-02-2025","roles":["Helpdesk"],"username":"j.doe"},"username":"j.doe"},{"error":"A user with the username 'helpdesk' already exists.","success":False,"username":"helpdesk"}]},"success":True})
+@users_bp.doc(tags=['User Management'], security=security_doc)
+@token_active
+@admin_required
+@introspection_required
+def api_create_users(json_data: dict):
+    """
+    Creates many users at once, optionally with realm roles. Requires admin role.
+
+    The users are created independently: the result reports for each one whether it was created,
+    so a failure (e.g. an existing username) does not prevent the creation of the others.
+
+    Returns:
+        - A JSON response with the result of each user, and the number of created and failed users.
+    """
+
+    try:
+        results = kutils.create_users(json_data["users"])
+        created = sum(1 for result in results if result["success"])
+
+        return {
+            'help': request.url,
+            'result': {
+                'users': results,
+                'created': created,
+                'failed': len(results) - created
+            },
+            'success': True
+        }, 200
+
+    except ValueError as ve:
+        return {
+            "help": request.url,
+            "error": {
+                "name": f"Validation error: {ve}",
+                '__type': 'User Entity Error',
+            },
+            "success": False
+        }, 400
+
+    except Exception as e:
+        return {
+            "help": request.url,
+            "error": {
+                "name": f"Error: {e}",
+                '__type': 'Unknown Error',
+            },
+            "success": False
+        }, 500
+
 @users_bp.route('/<user_id>', methods=['GET'])
 @users_bp.output(schema.ResponseAmbiguous, status_code=200)
 @users_bp.doc(tags=['User Management'], security=security_doc)
@@ -275,6 +332,7 @@ def api_get_user(user_id):
 @users_bp.doc(tags=['User Management'], security=security_doc)
 @token_active
 @admin_required
+@introspection_required
 def api_put_user(user_id, json_data):
     """
     Updates information of a specific user (id). Requires admin role.
@@ -337,6 +395,7 @@ def api_put_user(user_id, json_data):
 @users_bp.doc(tags=['User Management'], security=security_doc)
 @token_active
 @admin_required
+@introspection_required
 def api_delete_user(user_id):
     """
     Deletes a specific user (id or username). Requires admin role.
@@ -414,6 +473,7 @@ def api_get_roles():
 @users_bp.doc(tags=['Authorization Management'], security=security_doc)
 @token_active
 @admin_required
+@introspection_required
 def api_assign_role(user_id, role_id):
     """
     Assign role to a specific user by ID and by Role ID. Requires admin role.
@@ -464,6 +524,7 @@ def api_assign_role(user_id, role_id):
 @users_bp.doc(tags=['Authorization Management'], security=security_doc)
 @token_active
 @admin_required
+@introspection_required
 def api_delete_role(user_id, role_id):
     """
     Unassign a role from a specific user by ID. Requires admin role.
@@ -514,6 +575,7 @@ def api_delete_role(user_id, role_id):
 @users_bp.doc(tags=['Authorization Management'], security=security_doc)
 @token_active
 @admin_required
+@introspection_required
 def api_assign_roles(user_id, json_data):
     """
     Assing lots-of roles to a specific user by ID. Will not remove any roles already assigned to the user. Requires admin role.
@@ -564,6 +626,7 @@ def api_assign_roles(user_id, json_data):
 @users_bp.doc(tags=['Authorization Management'], security=security_doc)
 @token_active
 @admin_required
+@introspection_required
 def api_patch_roles(user_id, json_data):
     """
         Update the roles of a user. Requires admin role.
@@ -1,7 +1,7 @@
 import json
 import logging
 from apiflask import Schema, abort
-from apiflask.fields import Boolean, Integer, String, DateTime, Dict, List, URL
+from apiflask.fields import Boolean, Integer, String, Date, DateTime, Dict, List, URL, Nested
 from apiflask.validators import Length, OneOf, Regexp, Range
 from marshmallow import pre_load, fields, INCLUDE, validates, post_dump, ValidationError, validate, validates_schema
 
@@ -50,6 +50,15 @@ class Identifier(Schema):
 class PaginationParameters(Schema):
     limit = Integer(required=False)
     offset = Integer(required=False)
+    # The next_cursor of the previous page, continues right after it (offset is then ignored)
+    after = String(required=False, validate=Length(0, 200))
+    # Also return the total number of items, counted in the same query
+    with_total = Boolean(required=False)
+
+class UserSearchParameters(Schema):
+    limit = Integer(required=False)
+    offset = Integer(required=False)
+    search = String(required=False, validate=Length(0, 100))
 
 class ComputerQueryParameters(Schema):
     label = Integer(required=True)
@@ -59,10 +68,17 @@ class JobQueryPatameters(Schema):
     offset = Integer(required=False)
     filter = String(required=True, validate=OneOf(["all", "recent"]))
     sort = String(required=True, validate=OneOf(["signed_at", "created_at"]))
+    after = String(required=False, validate=Length(0, 200))
+    with_total = Boolean(required=False)
 
 class JobCountParameters(Schema):
     filter = String(required=True, validate=OneOf(["all", "recent"]))
 
+class TrafficParameters(Schema):
+    start = Date(required=False)
+    end = Date(required=False)
+    networks = List(String(validate=Length(0, 20)), required=False)
+
 class RolesInput(Schema):
     roles = List(String, required=True)
 
@@ -70,6 +86,9 @@ class GenericSearch(Schema):
     search = String(required=True)
     limit = String(required=False)
     offset = String(required=False)
+    # 'substring' matches the identifiers and addresses, 'fulltext' ranks the matches over all descriptive columns
+    mode = String(required=False, validate=OneOf(["substring", "fulltext"]))
+    with_total = Boolean(required=False)
 
 class NewUser(Schema):
     username = String(required=True, validate=Length(3, 25))
@@ -78,6 +97,12 @@ class NewUser(Schema):
     password = String(required=True, validate=Length(8, 25))
     enabled = Boolean(required=True)
 
+class NewBulkUser(NewUser):
+    roles = List(String, required=False)
+
+class NewUsers(Schema):
+    users = List(Nested(NewBulkUser), required=True, validate=Length(1, 1000))
+
 class NewComputerRegistration(Schema):
     created_by = String(required=True, validate=Length(max=50))
     uuid_label = Integer(required=False, validate=Range(min=100))
@@ -116,6 +141,22 @@ class NewComputerRegistration(Schema):
     telephone = String(validate=Length(max=20))
     office_location = String(validate=Length(max=20))
 
+class ComputerImportParameters(Schema):
+    format = String(required=False, validate=OneOf(["csv", "ndjson"]))
+    created_by = String(required=False, validate=Length(max=50))
+
+class ExportParameters(Schema):
+    format = String(required=False, load_default="ndjson", validate=OneOf(["csv", "ndjson", "arrow", "parquet"]))
+
+class JobExportParameters(ExportParameters):
+    filter = String(required=False, load_default="all", validate=OneOf(["all", "recent"]))
+
+class EntryExportParameters(ExportParameters):
+    uuid_label = Integer(required=False)
+
+class TicketExportParameters(ExportParameters):
+    status = List(String(validate=OneOf(["open", "closed", "in-progress", "awaiting"])), required=False)
+
 class UpdatedComputer(Schema):
     created_by = String(required=True, validate=Length(max=50))
     uuid_label = Integer(required=False, validate=Range(min=100))
@@ -211,6 +252,8 @@ class TicketSearchParameters(Schema):
         ),
         required=False
     )
+    after = String(required=False, validate=Length(0, 200))
+    with_total = Boolean(required=False)
 
 class ActivationInput(Schema):
     id = String(required=True, validate=Length(0, 50))
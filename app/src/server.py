@@ -13,6 +13,9 @@ import time
 from requests.models import Response
 import logging
 from auth import auth, security_doc, token_active
+import kutils
+import user_directory
+from db import database, migrate
 
 from flask import request, jsonify, current_app, redirect, session, url_for
 from apiflask import APIFlask
@@ -86,19 +89,76 @@ def main(app):
         'dbpass': os.getenv('POSTGRES_PASSWORD', '<DB-PASSWORD>'),
         'dbhost': os.getenv('POSTGRES_HOST', '<DB-HOST>'),
         'dbport': os.getenv('POSTGRES_PORT', '5432'),
+        # Connection pool of each worker process: DB_POOL_SIZE persistent connections plus up to DB_MAX_OVERFLOW temporary ones
+        'DB_POOL_SIZE': int(os.getenv('DB_POOL_SIZE', '5')),
+        'DB_MAX_OVERFLOW': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+        # Seconds a request waits for a free connection before failing
+        'DB_POOL_TIMEOUT': int(os.getenv('DB_POOL_TIMEOUT', '30')),
+        # Connections older than DB_POOL_RECYCLE seconds are replaced, -1 keeps them forever
+        'DB_POOL_RECYCLE': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+        # Test each connection when it is checked out and replace it if it is dead
+        'DB_POOL_PRE_PING': os.getenv('DB_POOL_PRE_PING', 'True') == 'True',
+        # Apply the pending schema migrations (db/migrations) when the application starts
+        'DB_MIGRATE_ON_START': os.getenv('DB_MIGRATE_ON_START', 'True') == 'True',
+        # Comma-separated URLs of read replicas (e.g. postgresql://replica:5432), the GET handlers read from them.
+        # The user, password and database of the primary are used unless a URL sets its own
+        'DB_REPLICA_URLS': [url.strip() for url in os.getenv('DB_REPLICA_URLS', '').split(',') if url.strip()],
+        # Seconds a replica that could not be connected to is skipped
+        'DB_REPLICA_RETRY_INTERVAL': int(os.getenv('DB_REPLICA_RETRY_INTERVAL', '30')),
+        # Lists longer than JSON_STREAM_MIN_ITEMS are streamed in chunks by the @lean_output endpoints, 0 never streams
+        'JSON_STREAM_MIN_ITEMS': int(os.getenv('JSON_STREAM_MIN_ITEMS', '1000')),
+        # Datetimes of the @lean_output endpoints: 'http' (as Flask's jsonify, e.g. Sun, 05 Jan 2025 15:06:00 GMT) or 'iso' (ISO 8601)
+        'JSON_DATETIME_FORMAT': os.getenv('JSON_DATETIME_FORMAT', 'http'),
 
         'KEYCLOAK_URL': os.getenv('KEYCLOAK_URL', 'http://keycloak:8080'),
         'KEYCLOAK_CLIENT_ID': os.getenv('KEYCLOAK_CLIENT_ID', 'stelar'),
         'KEYCLOAK_CLIENT_SECRET': os.getenv('KEYCLOAK_CLIENT_SECRET', 'none'),
-        'REALM_NAME': os.getenv('REALM_NAME','master')
+        'REALM_NAME': os.getenv('REALM_NAME','master'),
+        # Keep-alive connections per shared Keycloak client, size it to the number of worker threads
+        'KEYCLOAK_POOL_SIZE': int(os.getenv('KEYCLOAK_POOL_SIZE', '10')),
+        'KEYCLOAK_TIMEOUT': int(os.getenv('KEYCLOAK_TIMEOUT', '60')),
+        # Upper bound of concurrent Keycloak calls a single request may fan out to
+        'KEYCLOAK_MAX_WORKERS': int(os.getenv('KEYCLOAK_MAX_WORKERS', '8')),
+        # Seconds between refreshes of the local user directory, 0 serves user listings from Keycloak directly
+        'USER_DIRECTORY_SYNC_INTERVAL': int(os.getenv('USER_DIRECTORY_SYNC_INTERVAL', '300')),
+        # Seconds between full listings of the realm users, the syncs in between only read the users changed by admin events
+        'USER_DIRECTORY_FULL_SYNC_INTERVAL': int(os.getenv('USER_DIRECTORY_FULL_SYNC_INTERVAL', '3600')),
+
+        # Token verification: 'introspection' asks Keycloak for every request, 'local' verifies the JWT against the cached realm keys
+        'TOKEN_VERIFICATION': os.getenv('TOKEN_VERIFICATION', 'introspection'),
+        'TOKEN_AUDIENCE': os.getenv('TOKEN_AUDIENCE', os.getenv('KEYCLOAK_CLIENT_ID', 'stelar')),
+        # The 'iss' claim of the realm's tokens: the public URL of the realm (see KC_HOSTNAME), by default the one of KEYCLOAK_URL
+        'TOKEN_ISSUER': os.getenv('TOKEN_ISSUER') or f"{os.getenv('KEYCLOAK_URL', 'http://keycloak:8080').rstrip('/')}/realms/{os.getenv('REALM_NAME', 'master')}",
+        'JWKS_CACHE_TTL': int(os.getenv('JWKS_CACHE_TTL', '3600')),
+        'JWKS_MIN_REFRESH_INTERVAL': int(os.getenv('JWKS_MIN_REFRESH_INTERVAL', '30')),
+
+        # Introspection responses are cached until the token expires, but at most INTROSPECTION_CACHE_TTL seconds (0 disables the cache)
+        'INTROSPECTION_CACHE_TTL': int(os.getenv('INTROSPECTION_CACHE_TTL', '30')),
+        'INTROSPECTION_CACHE_SIZE': int(os.getenv('INTROSPECTION_CACHE_SIZE', '4096')),
+        # Seconds the realm role catalog used to resolve role IDs and names is cached
+        'ROLE_CATALOG_TTL': int(os.getenv('ROLE_CATALOG_TTL', '300')),
+        # Maximum number of usernames whose UUID is kept in memory
+        'USER_ID_CACHE_SIZE': int(os.getenv('USER_ID_CACHE_SIZE', '10000'))
     }
 
     secret_file = open("/usr/shared/client-secret.txt", "r")
     client_secret = secret_file.read()
     app.config['settings']['KEYCLOAK_CLIENT_SECRET'] = client_secret
+    # The shared Keycloak clients must be rebuilt with the new secret
+    kutils.reset_clients()
 
     print('This is the client secret:', client_secret)
 
+    kutils.configure_caches(app.config['settings'])
+
+    database.init_engine(app.config['settings'])
+
+    if app.config['settings']['DB_MIGRATE_ON_START']:
+        migrate.migrate(database.engine)
+
+    if app.config['settings']['USER_DIRECTORY_SYNC_INTERVAL'] > 0:
+        user_directory.start_background_sync(app, kutils.sync_user_directory, app.config['settings']['USER_DIRECTORY_SYNC_INTERVAL'])
+
     # Apply configuration settings for this API
     app.title = app.config['settings']['API_TITLE']
     app.version = app.config['settings']['API_VERSION']
@@ -52,37 +52,17 @@ document.addEventListener("DOMContentLoaded", function () {
     }
   }
 
-  async function fetchTotalCount() {
-    const url = isSearching
-      ? `/api/v1/computers/generic/count?search=${encodeURIComponent(
-          searchQuery
-        )}`
-      : `/api/v1/computers/count`;
-
-    try {
-      const response = await fetch(url);
-      if (!response.ok) {
-        throw new Error(`HTTP error! Status: ${response.status}`);
-      }
-      const data = await response.json();
-      totalComputers = data.result.count;
-      return data.result.count;
-    } catch (error) {
-      console.error("Error fetching total count:", error);
-      totalComputers = 0;
-      return 0;
-    }
-  }
-
   async function fetchComputers() {
     if (isSearching) {
+      // The total number of results comes with the page, no separate count request
       const url = `/api/v1/computers/generic?search=${encodeURIComponent(
         searchQuery
-      )}&offset=${offset}&limit=${limit}`;
+      )}&offset=${offset}&limit=${limit}&with_total=true`;
       const response = await fetch(url);
       const data = await response.json();
 
       if (response.status === 200) {
+        totalComputers = data.result.total;
         tableBody.innerHTML = "";
         updatePagination();
         if (data.result.count > 0) {
@@ -125,12 +105,13 @@ document.addEventListener("DOMContentLoaded", function () {
         window.location.href = `/403?message=${data.error.name}`;
       }
     } else {
-      const url = `/api/v1/computers/?offset=${offset}&limit=${limit}`;
+      const url = `/api/v1/computers/?offset=${offset}&limit=${limit}&with_total=true`;
 
       const response = await fetch(url);
       const data = await response.json();
 
       if (response.status === 200) {
+        totalComputers = data.result.total;
         tableBody.innerHTML = "";
         updatePagination();
         if (data.result.count > 0) {
@@ -210,13 +191,9 @@ document.addEventListener("DOMContentLoaded", function () {
         isSearching = false;
       }
 
-      fetchTotalCount().then(() => {
-        fetchComputers();
-      });
+      fetchComputers();
     }
   });
 
-  fetchTotalCount().then(() => {
-    fetchComputers();
-  });
+  fetchComputers();
 });
@@ -24,6 +24,7 @@ document.addEventListener("DOMContentLoaded", () => {
       const params = new URLSearchParams();
       params.append("offset", offset);
       params.append("limit", limit);
+      params.append("with_total", "true");
 
       if (chkOpen.checked) {
         params.append("status", "open");
@@ -45,7 +46,7 @@ document.addEventListener("DOMContentLoaded", () => {
       const data = await response.json();
 
       const tickets = data.result.tickets;
-      const total = data.result.count;
+      const total = data.result.total;
 
       // Clear the table first
       ticketsBody.innerHTML = "";
@@ -131,7 +132,7 @@ document.addEventListener("DOMContentLoaded", () => {
         prevPage.classList.remove("disabled");
       }
       // If offset+limit >= total, disable the "Next" button
-      if (total < limit) {
+      if (offset + tickets.length >= total) {
         nextPage.classList.add("disabled");
       } else {
         nextPage.classList.remove("disabled");
@@ -0,0 +1,214 @@
+from collections import defaultdict
+import threading
+import logging
+import time
+
+"""
+    This .py file contains the local mirror of the realm users (and their
+    realm roles) that the user management endpoints list and search,
+    instead of querying Keycloak on every request.
+
+    The mirror is refreshed by a background thread (kutils.sync_user_directory)
+    and kept up to date by the user management operations of kutils (write-through).
+"""
+
+# The fields of a directory entry, same as the items of kutils.get_users_from_keycloak()
+USER_FIELDS = ("username", "fullname", "joined_date", "id", "roles", "active")
+
+# Length of the n-grams of the search index, longer search texts are matched on their n-grams
+GRAM_SIZE = 3
+
+def _grams(key: str) -> set:
+    """
+    Returns the substrings of a search key of up to GRAM_SIZE characters.
+    """
+    return {key[start:start + size] for size in range(1, GRAM_SIZE + 1) for start in range(len(key) - size + 1)}
+
+class UserDirectory:
+    """
+    A thread-safe in-memory directory of users, ordered by username.
+
+    Every entry is indexed by ID and by username, and carries a lowercase search key
+    (username and fullname) used for case-insensitive substring search. The search index
+    maps every substring of up to GRAM_SIZE characters of the keys to the users holding it:
+    a short search text is looked up directly, a longer one is only checked against the users
+    holding all of its n-grams.
+    """
+
+    def __init__(self):
+        self._users = {}
+        self._ids_by_username = {}
+        self._search_keys = {}
+        self._grams = defaultdict(set)
+        self._ordered_ids = []
+        self._positions = {}
+        self._lock = threading.RLock()
+        self.synced_at = None
+
+    def _index(self, user_id: str, key: str):
+        for gram in _grams(key):
+            self._grams[gram].add(user_id)
+
+    def _unindex(self, user_id: str, key: str):
+        for gram in _grams(key):
+            holders = self._grams.get(gram)
+            if holders is not None:
+                holders.discard(user_id)
+                if not holders:
+                    del self._grams[gram]
+
+    def _put(self, user: dict):
+        previous = self._users.get(user["id"])
+        if previous is not None:
+            self._ids_by_username.pop(previous["username"], None)
+
+        key = f"{user['username']}\x00{user['fullname']}".lower()
+        previous_key = self._search_keys.get(user["id"])
+        if previous_key != key:
+            if previous_key is not None:
+                self._unindex(user["id"], previous_key)
+            self._index(user["id"], key)
+
+        self._users[user["id"]] = user
+        self._ids_by_username[user["username"]] = user["id"]
+        self._search_keys[user["id"]] = key
+
+    def _drop(self, user_id: str) -> bool:
+        user = self._users.pop(user_id, None)
+        if user is None:
+            return False
+        self._ids_by_username.pop(user["username"], None)
+        self._unindex(user_id, self._search_keys.pop(user_id))
+        return True
+
+    def _reindex(self):
+        self._ordered_ids = sorted(self._users, key=lambda user_id: self._users[user_id]["username"] or "")
+        self._positions = {user_id: position for position, user_id in enumerate(self._ordered_ids)}
+
+    def _matches(self, text: str) -> list:
+        if len(text) <= GRAM_SIZE:
+            candidates = self._grams.get(text, ())
+        else:
+            # Start from the rarest n-gram, the intersection only shrinks
+            holders = sorted((self._grams.get(text[start:start + GRAM_SIZE], set()) for start in range(len(text) - GRAM_SIZE + 1)), key=len)
+            candidates = [user_id for user_id in holders[0].intersection(*holders[1:]) if text in self._search_keys[user_id]]
+
+        return sorted(candidates, key=self._positions.__getitem__)
+
+    def _merge(self, incoming: dict, removed: list) -> dict:
+        stats = {"added": 0, "updated": 0, "removed": 0}
+
+        with self._lock:
+            for user_id in removed:
+                if self._drop(user_id):
+                    stats["removed"] += 1
+
+            for user_id, user in incoming.items():
+                current = self._users.get(user_id)
+                if current is None:
+                    stats["added"] += 1
+                elif current != user:
+                    stats["updated"] += 1
+                else:
+                    continue
+                self._put(user)
+
+            if stats["added"] or stats["removed"] or stats["updated"]:
+                self._reindex()
+            self.synced_at = time.time()
+
+        return stats
+
+    def replace(self, users: list) -> dict:
+        """
+        Synchronizes the directory with a full listing of the realm users.
+        Only the entries that were added, changed or removed are touched.
+
+        Returns:
+            dict: The number of 'added', 'updated' and 'removed' entries.
+        """
+        incoming = {user["id"]: {field: user.get(field) for field in USER_FIELDS} for user in users}
+        with self._lock:
+            return self._merge(incoming, [user_id for user_id in self._users if user_id not in incoming])
+
+    def apply(self, users: list, removed: list) -> dict:
+        """
+        Synchronizes the directory with the changes of some users only, e.g. the users of the admin events since the last sync.
+
+        Args:
+            users (list): The current state of the changed users that still exist.
+            removed (list): The IDs of the changed users that no longer exist.
+
+        Returns:
+            dict: The number of 'added', 'updated' and 'removed' entries.
+        """
+        return self._merge({user["id"]: {field: user.get(field) for field in USER_FIELDS} for user in users}, removed)
+
+    def upsert(self, user: dict):
+        """
+        Adds or refreshes a single user, e.g. after it was created or modified.
+        """
+        with self._lock:
+            self._put({field: user.get(field) for field in USER_FIELDS})
+            self._reindex()
+
+    def remove(self, user_id: str):
+        with self._lock:
+            if self._drop(user_id):
+                self._reindex()
+
+    def get(self, user_id: str) -> dict:
+        """
+        Returns the user with the given UUID or username, None if it is not in the directory.
+        """
+        with self._lock:
+            user_id = self._ids_by_username.get(user_id, user_id)
+            user = self._users.get(user_id)
+            return dict(user) if user is not None else None
+
+    def search(self, text: str = None, offset: int = 0, limit: int = 0) -> tuple[list, int]:
+        """
+        Searches the users whose username or fullname contains the given text (case-insensitive).
+
+        Args:
+            text (str): The text to search for. All users match if it is empty.
+            offset (int): The number of matching users to skip.
+            limit (int): The maximum number of users returned, 0 returns all of them.
+
+        Returns:
+            tuple: The requested page of users ordered by username and the total number of matches.
+        """
+        text = (text or "").lower()
+
+        with self._lock:
+            if text:
+                matches = self._matches(text)
+            else:
+                matches = self._ordered_ids
+
+            page = matches[offset:offset + limit] if limit > 0 else matches[offset:]
+            return [dict(self._users[user_id]) for user_id in page], len(matches)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._users)
+
+directory = UserDirectory()
+
+def start_background_sync(app, sync, interval: int) -> threading.Thread:
+    """
+    Starts a daemon thread that calls sync() inside an application context every #interval seconds.
+    """
+    def run():
+        while True:
+            try:
+                with app.app_context():
+                    stats = sync()
+                logging.debug(f'User directory synchronized: {stats}')
+            except Exception as e:
+                logging.error(f'User directory synchronization failed: {str(e)}')
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="user-directory-sync", daemon=True)
+    thread.start()
+    return thread